@@ -0,0 +1,105 @@
+import streamlit as st
+
+from app.pages.Models.Polygon_farmer import PolygonFarmer, fetch_polygon_data, update_history
+from backend.model.jobs import DONE, FAILED, jobs
+
+# Seconds between checks for finished fetches while some are pending
+POLL_INTERVAL = 2
+
+
+def submit_fetch(polygon: PolygonFarmer):
+    """
+    Start fetching the data of a polygon in the background. Returns immediately.
+    A fetch of the same field that is still running, e.g. from another session, is reused.
+    """
+    job = jobs.get(polygon.field_id)
+    if job is not None and job.finished:
+        # fetch again, results that are still current come from the shared results without a new request
+        jobs.forget(polygon.field_id)
+    return jobs.submit(polygon.field_id, fetch_polygon_data, polygon.field_id, polygon.coords.tolist())
+
+
+def _history_key(field_id):
+    return "history", field_id
+
+
+def submit_history_update(polygon: PolygonFarmer):
+    """
+    Start backfilling the history of a polygon in the background, separately from its prediction.
+    """
+    key = _history_key(polygon.field_id)
+    job = jobs.get(key)
+    if job is not None and job.finished:
+        jobs.forget(key)
+    return jobs.submit(key, update_history, polygon.field_id, polygon.coords.tolist())
+
+
+def history_state(polygon: PolygonFarmer):
+    """
+    State of the latest history backfill of the polygon, with its job (None if none was submitted).
+    """
+    job = jobs.get(_history_key(polygon.field_id))
+    return (job.state, job) if job else (None, None)
+
+
+def fetch_state(polygon: PolygonFarmer):
+    """
+    queued/running/done/failed, or None if no fetch was submitted for the polygon.
+    """
+    if polygon.fetched_data:
+        return DONE
+    job = jobs.get(polygon.field_id)
+    return job.state if job else None
+
+
+def collect_fetch_results():
+    """
+    Copy the results of finished background fetches into the session's polygons.
+    Failed fetches are shown with a button to submit them again.
+    :return: Number of polygons whose fetch is still queued or running
+    """
+    if "fetched_data" not in st.session_state:
+        st.session_state.fetched_data = {}
+
+    pending = 0
+    for polygon in st.session_state.get('polygons', []):
+        if polygon.fetched_data:
+            continue
+        job = jobs.get(polygon.field_id)
+        if job is None:
+            continue
+        if job.state == DONE:
+            polygon.apply_data(job.result)
+            st.session_state.fetched_data[f"polygon_{polygon.pid}"] = polygon.data()
+            # the prediction is shown right away, past acquisitions are fetched afterwards
+            submit_history_update(polygon)
+        elif job.state == FAILED:
+            st.warning(f"Could not fetch data for polygon {polygon.pid}: {job.error}")
+            if st.button("Retry", key=f"retry_fetch_{polygon.pid}"):
+                submit_fetch(polygon)
+                pending += 1
+        else:
+            pending += 1
+    return pending
+
+
+def watch_pending_fetches(pending):
+    """
+    Show the number of pending fetches and rerun the app once one of them finished.
+    """
+    if not pending:
+        return
+
+    st.info(f"Fetching data for {pending} field(s) in the background...")
+
+    if not hasattr(st, "fragment"):
+        st.button("Refresh")
+        return
+
+    @st.fragment(run_every=POLL_INTERVAL)
+    def check_jobs():
+        for polygon in st.session_state.get('polygons', []):
+            if not polygon.fetched_data and fetch_state(polygon) in (DONE, FAILED):
+                st.rerun()
+
+    check_jobs()
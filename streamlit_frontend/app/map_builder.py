@@ -0,0 +1,131 @@
+import json
+
+import folium
+import folium.plugins
+import streamlit as st
+from branca.element import MacroElement
+from jinja2 import Template
+
+from backend.model.tracing import span
+
+SELECTED_STYLE = {
+    'fillColor': 'red',
+    'color': 'red',
+    'weight': 2
+}
+
+
+def style_feature(feature):
+    # data-driven style, shared by all fields of the collection
+    properties = feature['properties']
+    if properties['selected']:
+        return SELECTED_STYLE
+    return {
+        'fillColor': properties['color'],
+        'color': properties['color'],
+        'weight': 0.5
+    }
+
+
+def feature_collection(polygons, selected=None):
+    """
+    All fields as a single GeoJSON FeatureCollection, with the properties used for styling.
+    """
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': p.geojson,
+                'properties': {'pid': p.pid, 'color': p.color, 'selected': p is selected},
+            }
+            for p in polygons
+        ],
+    }
+
+
+class SerializedGeoJson(MacroElement):
+    """
+    GeoJSON layer from an already serialized FeatureCollection whose features carry their Leaflet style in
+    properties.style. Unlike folium.GeoJson the data is not serialized and styled again on every render.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson({{ this.data }}, {
+            style: function(feature) { return feature.properties.style; }
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, data):
+        super().__init__()
+        self._name = "GeoJson"
+        self.data = data
+
+
+def serialize_collection(collection):
+    # styles resolved once, and safe to embed in a <script> element
+    for feature in collection['features']:
+        feature['properties']['style'] = style_feature(feature)
+    return json.dumps(collection, separators=(',', ':')).replace('</', '<\\/')
+
+
+def _cached(name, layer, signature, build):
+    # session-wide cache holding the last value built for every name; only plain data is kept, folium
+    # objects are created fresh on every run because st_folium attaches the field layer to the map it renders
+    cache = st.session_state.setdefault('map_cache', {})
+    key = f'{name}_{layer}'
+    with span("map.build", layer=layer) as build_span:
+        entry = cache.get(key)
+        if entry is None or entry[0] != signature:
+            build_span.set(cache="miss")
+            entry = (signature, build())
+            cache[key] = entry
+        else:
+            build_span.set(cache="hit")
+    return entry[1]
+
+
+def base_map(name, location, zoom=18, draw_polygons=None):
+    """
+    Folium map without fields, created on every run from the view of its first run per name and drawing mode.
+    The map's script stays the same while the fields change, so st_folium does not send it again;
+    fields are added on the client through field_layer.
+    :param draw_polygons: None for no drawing control, otherwise whether drawing polygons is enabled
+    """
+    location, zoom = _cached(name, 'base', draw_polygons, lambda: (list(location), zoom))
+    m = folium.Map(location=location, zoom_start=zoom)
+    if draw_polygons is not None:
+        # Add drawing control to the map
+        folium.plugins.Draw(
+            export=True,
+            draw_options={
+                "polyline": False,
+                "rectangle": False,
+                "circle": False,
+                "circlemarker": False,
+                "polygon": draw_polygons,
+                "marker": False,
+            }
+        ).add_to(m)
+    return m
+
+
+def field_layer(name, polygons, selected=None, marker=None):
+    """
+    Feature group with all fields in one GeoJSON layer, created on every run. The FeatureCollection is
+    only built and serialized again when the fields, their colors or the selection change.
+    :param marker: Optional (lat, lon) of a marker for the selected field
+    """
+    signature = (
+        tuple((p.pid, p.field_id, p.color) for p in polygons),
+        selected.pid if selected is not None else None,
+    )
+    data = _cached(name, 'fields', signature, lambda: serialize_collection(feature_collection(polygons, selected)))
+
+    layer = folium.FeatureGroup(name="Fields")
+    SerializedGeoJson(data).add_to(layer)
+    if marker is not None:
+        folium.Marker(list(marker), popup="Selected Polygon").add_to(layer)
+    return layer
@@ -1,61 +1,90 @@
+import logging
+
+import numpy as np
 from shapely.geometry import Polygon
-import streamlit as st
-from backend.model.predict import predict_on_polygon
+
+from backend.model.geometry import geometry_key, polygon_area, polygon_bbox, polygon_centroid
+from backend.model.shared_results import results as shared_results
+from backend.model.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def exterior_coords(polygon):
+    """
+    Exterior ring of a GeoJSON feature, a GeoJSON geometry or a list of [longitude, latitude] pairs
+    as a contiguous (n, 2) float64 array.
+    """
+    if isinstance(polygon, dict):
+        geometry = polygon.get("geometry", polygon)
+        polygon = geometry["coordinates"][0]
+    return np.ascontiguousarray(np.asarray(polygon, dtype=np.float64)[:, :2])
 
 
 class PolygonFarmer:
+    """
+    A monitored field. Stores its exterior ring as a float64 array and derives the shapely geometry,
+    bounds, centroid and area (in square meters) lazily, once. Does not depend on Streamlit.
+    """
+
+    __slots__ = (
+        "pid", "coords", "field_id", "water", "fetched_data", "soil_moisture", "vegetation_health",
+        "temperature", "humidity", "color", "_geometry", "_bounds", "_centroid", "_area",
+    )
 
     # create a class for every single polygon
-    def __init__(self, x: int, polygon, fetched_data=False, water=None, soil_moisture=None, vegetation_health=None):
+    def __init__(self, x: int, polygon, fetched_data=False, water=None, soil_moisture=None, vegetation_health=None,
+                 field_id=None):
         self.pid: int = x
-        self.polygon = polygon
+        self.coords = exterior_coords(polygon)
+        self.field_id = field_id or geometry_key(self.coords.tolist())
         self.water = water
         self.fetched_data = fetched_data
         self.soil_moisture = soil_moisture
         self.vegetation_health = vegetation_health
-        self.centroid = self.polygon_centroid()
-        self.area = self.calculate_area()
-        self.color = self.calculate_color()
         self.temperature = None
         self.humidity = None
+        self._geometry = None
+        self._bounds = None
+        self._centroid = None
+        self._area = None
+        self.color = self.calculate_color()
 
-    from shapely.geometry import Polygon
-
-    def polygon_centroid(self):
-        try:
-            # Extract coordinates from the GeoJSON structure
-            coords = self.polygon["geometry"]["coordinates"][0]
-
-            # Ensure each point is in (longitude, latitude) format
-            coords = [(lon, lat) for lon, lat in coords]
-
-            # Create a Shapely Polygon and calculate its centroid
-            polygon = Polygon(coords)
-
-            # Check if the polygon is valid (non-self-intersecting, closed ring, etc.)
-            if not polygon.is_valid:
-                raise ValueError("Invalid polygon geometry")
-
-            centroid = polygon.centroid
-
-            # Return the centroid's coordinates (longitude, latitude)
-            return centroid.x, centroid.y  # x is longitude, y is latitude
-
-        except Exception as e:
-            print(f"An error occurred while calculating the centroid: {e}")
-            return None, None
-
-    def calculate_area(self):
-        # calculate the area of the polygon
-        coords = self.polygon["geometry"]["coordinates"][0]
-        n = len(coords)
-        area = 0
-        for i in range(n):
-            j = (i + 1) % n
-            area += coords[i][0] * coords[j][1]
-            area -= coords[j][0] * coords[i][1]
-        area = abs(area) / 2
-        return area
+    @property
+    def polygon(self):
+        # GeoJSON feature of the field, built on demand
+        return {"type": "Feature", "properties": {}, "geometry": self.geojson}
+
+    @property
+    def geojson(self):
+        return {"type": "Polygon", "coordinates": [self.coords.tolist()]}
+
+    @property
+    def geometry(self):
+        if self._geometry is None:
+            self._geometry = Polygon(self.coords)
+        return self._geometry
+
+    @property
+    def bounds(self):
+        # [min_lon, min_lat, max_lon, max_lat]
+        if self._bounds is None:
+            self._bounds = polygon_bbox(self.coords)
+        return self._bounds
+
+    @property
+    def centroid(self):
+        # (longitude, latitude)
+        if self._centroid is None:
+            self._centroid = polygon_centroid(self.coords)
+        return self._centroid
+
+    @property
+    def area(self):
+        # square meters
+        if self._area is None:
+            self._area = polygon_area(self.coords)
+        return self._area
 
     def calculate_color(self):
         # calculate average of all three values and return color on scale from red to green
@@ -90,37 +119,88 @@ class PolygonFarmer:
 
     def fetch_data(self):
         # fetch data from API
-        coords = self.polygon["geometry"]["coordinates"][0]
-        print("hjere")
-        should_irrigate, evi_index, moisture_stress, current_temp, current_humidity = predict_on_polygon(coords)
+        self.apply_data(fetch_polygon_data(self.field_id, self.coords.tolist()))
+        return self.data()
+
+    def apply_data(self, data):
+        # store data returned by fetch_polygon_data
+        self.water = data["water"]
+        self.soil_moisture = data["soil_moisture"]
+        self.vegetation_health = data["vegetation_health"]
+        self.temperature = data["temperature"]
+        self.humidity = data["humidity"]
+        self.fetched_data = True
+        # the field layer is rebuilt when the color changes
+        self.calculate_color()
+
+    def data(self):
+        return {
+            "water": self.water,
+            "soil_moisture": self.soil_moisture,
+            "vegetation_health": self.vegetation_health,
+            "temperature": self.temperature,
+            "humidity": self.humidity
+        }
 
-        # process predicted data
-        self.water = should_irrigate
+    def __str__(self):
+        return (f"Polygon with area {self.area} and centroid {self.centroid} with color {self.color}\n Data: "
+                f"Water: {self.water}, Soil Moisture: {self.soil_moisture}, Vegetation Health: {self.vegetation_health}, ")
 
-        # convert the values to percentage
 
-        # moisture stress is in range -1 to 1
-        self.soil_moisture = (moisture_stress + 1) * 50
+def fetch_polygon_data(field_id, coords, interval=None):
+    """
+    Run the prediction for a polygon and record today's weather reading. Does not touch the Streamlit session,
+    so it can run in a background thread. The history of past acquisitions is filled separately by update_history.
+    Results are shared by all sessions of the process per field and time window: a field that another session
+    already fetched, or is fetching right now, is not fetched again.
+    :param interval: (start_date, end_date) of the Sentinel-2 data, the last ten days if not given
+    :return: Dict with water, soil_moisture, vegetation_health, temperature and humidity
+    """
+    # imported here so the field model can be used without loading the prediction pipeline
+    from backend.model.irrigation import last_days
 
-        # evi index is in range 0 to 1
-        self.vegetation_health = evi_index * 100
+    interval = tuple(interval or last_days())
+    return shared_results.get_or_compute((field_id, interval), _fetch_polygon_data, field_id, coords, interval)
 
-        self.temperature = current_temp
-        self.humidity = current_humidity
-        self.fetched_data = True
 
-        if "fetched_data" not in st.session_state:
-            st.session_state.fetched_data = {}
-        else:
-            # add fetched data to the session state
-            st.session_state.fetched_data[f"polygon_{self.pid}"] = {
-                "water": self.water,
-                "soil_moisture": self.soil_moisture,
-                "vegetation_health": self.vegetation_health,
-                "temperature": self.temperature,
-                "humidity": self.humidity
-            }
+def _fetch_polygon_data(field_id, coords, interval):
+    from backend.model.predict import predict_on_polygon
+    from backend.model.timeseries import record_weather
 
-    def __str__(self):
-        return (f"Polygon with area {self.area} and centroid {self.centroid} with color {self.color}\n Data: "
-                f"Water: {self.water}, Soil Moisture: {self.soil_moisture}, Vegetation Health: {self.vegetation_health}, ")
+    should_irrigate, evi_index, moisture_stress, current_temp, current_humidity = predict_on_polygon(coords, interval)
+
+    # a failed write only leaves the weather history without today's reading, the prediction stands
+    try:
+        record_weather(field_id, current_temp, current_humidity)
+    except Exception:
+        logger.exception("Could not record the weather of field %s", field_id)
+
+    # convert the values to percentage
+    return {
+        "water": should_irrigate,
+        # moisture stress is in range -1 to 1
+        "soil_moisture": (moisture_stress + 1) * 50,
+        # evi index is in range 0 to 1
+        "vegetation_health": evi_index * 100,
+        "temperature": current_temp,
+        "humidity": current_humidity
+    }
+
+
+def update_history(field_id, coords):
+    """
+    Backfill the stored indicator history of a field with the acquisitions it is missing: one catalog search
+    and one request per missing date, so it runs as its own background job after the prediction.
+    Errors are logged and raised, the job then shows as failed and the stored history stays as it was.
+    :return: List of the newly stored dates
+    """
+    from backend.model.timeseries import update_field
+
+    with span("history.update") as history_span:
+        try:
+            added = update_field(field_id, coords)
+        except Exception:
+            logger.exception("Could not update the history of field %s", field_id)
+            raise
+        history_span.set(dates=len(added))
+    return added
@@ -0,0 +1,51 @@
+from app.pages.Models.Polygon_farmer import PolygonFarmer, exterior_coords
+from backend.model.geometry import geometry_key
+from backend.model.spatial_index import PolygonIndex
+
+
+class PolygonRegistry:
+    """
+    Content-addressed collection of the monitored polygons.
+    Drawings are identified by their normalized geometry, so the same shape is only ever added once,
+    and ids are handed out from a counter.
+    """
+
+    def __init__(self):
+        self.polygons = []
+        self.index = PolygonIndex()
+        self._by_key = {}
+        self._by_pid = {}
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def add(self, feature):
+        """
+        Register a GeoJSON feature drawn on the map.
+        :return: (PolygonFarmer, created); created is False if the geometry was already registered,
+        in which case the existing PolygonFarmer with its fetched data is returned
+        """
+        coords = exterior_coords(feature)
+        key = geometry_key(coords.tolist())
+        existing = self._by_key.get(key)
+        if existing is not None:
+            return existing, False
+
+        polygon_farmer = PolygonFarmer(self._next_id, coords, field_id=key)
+        self._next_id += 1
+        self._by_key[key] = polygon_farmer
+        self._by_pid[polygon_farmer.pid] = polygon_farmer
+        self.polygons.append(polygon_farmer)
+        self.index.add(polygon_farmer.pid, polygon_farmer.geometry)
+        return polygon_farmer, True
+
+    def get(self, pid):
+        return self._by_pid.get(pid)
+
+    def at(self, lon, lat):
+        """
+        First registered polygon containing the point, or None.
+        """
+        hits = self.index.query_point(lon, lat)
+        return self._by_pid[hits[0]] if hits else None
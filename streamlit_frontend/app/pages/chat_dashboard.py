@@ -1,9 +1,14 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
 
+from app.fetch_jobs import fetch_state, history_state
 from app.pages.Models.Polygon_farmer import PolygonFarmer
+from backend.model.jobs import DONE, FAILED
+from backend.model.timeseries import store
+
+# Upper bound of points sent to a chart, below the width of the chart in pixels
+CHART_MAX_POINTS = 600
+SEASON_DAYS = 183
 
 
 def polygon_details_page(polygon: PolygonFarmer):
@@ -19,6 +24,15 @@ def polygon_details_page(polygon: PolygonFarmer):
     # Title
     st.title(f"Showing Details for Selected Polygon {polygon.pid}")
 
+    # Placeholder until the background fetch has finished
+    if not polygon.fetched_data:
+        state = fetch_state(polygon)
+        if state == FAILED:
+            st.error("Fetching the data for this polygon failed.")
+        else:
+            st.info(f"Data for this polygon is being fetched ({state or 'not started'}).")
+        return
+
     # Create three columns for the main metrics
     col1, col2, col3 = st.columns(3)
 
@@ -106,22 +120,41 @@ def polygon_details_page(polygon: PolygonFarmer):
     st.subheader("Historical Data")
 
     # Tab layout for different historical views
-    tab1, tab2 = st.tabs(["7 Days", "30 Days"])
+    tab1, tab2, tab3, tab4 = st.tabs(["7 Days", "30 Days", "Season", "All"])
 
-    # Generate sample historical data
+    # Read the recorded history of the field, using the same scales as the metrics above
     def get_historical_data(days):
-        dates = pd.date_range(end=datetime.now(), periods=days, freq='D')
+        history = store.chart(
+            polygon.field_id, ['EVI Index', 'Moisture Stress', 'temperature'], days, max_points=CHART_MAX_POINTS
+        )
         return pd.DataFrame({
-            'Date': dates,
-            'Vegetation Health': np.random.uniform(70, 85, days),
-            'Soil Moisture': np.random.uniform(40, 60, days),
-            'Temperature': np.random.uniform(20, 28, days)
-        })
+            'Vegetation Health': history['EVI Index'] * 100,
+            'Soil Moisture': (history['Moisture Stress'] + 1) * 50,
+            'Temperature': history['temperature']
+        }, index=history.index)
+
+    # The history is backfilled in its own job; say so when the chart may be incomplete
+    state, job = history_state(polygon)
+    if state == FAILED:
+        st.warning(f"Could not update the history of this field, showing what was recorded before: {job.error}")
+    elif state is not None and state != DONE:
+        st.info("Updating the history of this field in the background...")
+
+    def show_historical_data(days):
+        hist_data = get_historical_data(days)
+        if hist_data.dropna(how='all').empty:
+            st.info("No history recorded for this field yet.")
+        else:
+            st.line_chart(hist_data)
 
     with tab1:
-        hist_data_7 = get_historical_data(7)
-        st.line_chart(hist_data_7.set_index('Date'))
+        show_historical_data(7)
 
     with tab2:
-        hist_data_30 = get_historical_data(30)
-        st.line_chart(hist_data_30.set_index('Date'))
+        show_historical_data(30)
+
+    with tab3:
+        show_historical_data(SEASON_DAYS)
+
+    with tab4:
+        show_historical_data(None)
@@ -1,14 +1,15 @@
 import streamlit as st
 from typing import List
-import folium
 import os
 from click import style
 from streamlit import columns, session_state
 from streamlit_folium import st_folium
-from geopy.geocoders import Nominatim
 
-from app.pages.Models.Polygon_farmer import PolygonFarmer
-from app.pages.chat_result import select_and_display_details_for_polygon
+from app.fetch_jobs import collect_fetch_results, submit_fetch, watch_pending_fetches
+from app.map_builder import base_map, field_layer
+from app.pages.chat_result import polygon_registry, select_and_display_details_for_polygon
+from backend.model.geocoding import geocode
+from backend.model.tracing import span
 
 
 def create_areas_to_monitor(location: str):
@@ -18,74 +19,59 @@ def create_areas_to_monitor(location: str):
     # set location state to the location
     st.session_state.location = location
 
-    def style2(selected):
-        return {
-            'fillColor': 'blue',
-            'color': 'blue',
-            'weight': 0.5
-        }
-
     # create state variable for storing drawings if not already created
-    if st.session_state.get('polygons') is None:
-        st.session_state.polygons: List[PolygonFarmer] = []
+    registry = polygon_registry()
+
+    # get lat, lon from location, cached so reruns do not hit the network
+    coordinates = geocode(st.session_state.location) if st.session_state.get('location') else None
 
     # create state variable for storing drawings
-    if st.session_state.get('location'):
-        # get lat, lon from location
-        geolocator = Nominatim(user_agent="streamlit_app")
-        location = geolocator.geocode(st.session_state.location)
-        lat, lon = location.latitude, location.longitude
+    if coordinates:
+        lat, lon = coordinates
 
         # if there are already drawings, make lat, lon the average of all the polygons
         if st.session_state.polygons:
             sum_lat = 0
             sum_lon = 0
             for p in st.session_state.polygons:
-                coords = p.polygon['geometry']['coordinates'][0][0]
-                sum_lat += coords[1]
-                sum_lon += coords[0]
+                centroid_lon, centroid_lat = p.centroid
+                sum_lat += centroid_lat
+                sum_lon += centroid_lon
 
             lat = sum_lat / len(st.session_state.polygons)
             lon = sum_lon / len(st.session_state.polygons)
 
-        # Create a folium map centered on the address
-        m = folium.Map(location=[lat, lon], zoom_start=18)
-
-        # Add drawing control to the map
-        draw = folium.plugins.Draw(
-            export=True,
-            draw_options={
-                "polyline": False,
-                "rectangle": False,
-                "circle": False,
-                "circlemarker": False,
-                "polygon": not st.session_state.show_select_polygon_page,
-                "marker": False,
-            }
-        )
-        draw.add_to(m)
-
-        for p in st.session_state.polygons:
-            folium.GeoJson(p.polygon, name="Polygon", style_function=style2).add_to(m)
+        # The base map is cached, fields are sent as a single layer that is only rebuilt when they change
+        m = base_map("selection", [lat, lon], draw_polygons=not st.session_state.show_select_polygon_page)
+        fields = field_layer("selection", st.session_state.polygons)
 
         # Render the map in Streamlit
-        map_data = st_folium(m, use_container_width=True, height=500)
+        with span("map.render", page="selection"):
+            map_data = st_folium(
+                m,
+                key="selection_map",
+                center=[lat, lon],
+                feature_group_to_add=fields,
+                returned_objects=["all_drawings"],
+                use_container_width=True,
+                height=500,
+            )
 
         # Check if a polygon was drawn and extract its coordinates
         if map_data and 'all_drawings' in map_data and map_data['all_drawings']:
+            added = False
             for p in map_data['all_drawings']:
-                print("add drawing")
-                # find the last id
-                last_id = 0
-                for polygon in st.session_state.polygons:
-                    if polygon.pid > last_id:
-                        last_id = polygon.pid
-
-                polygon_farmer = PolygonFarmer(last_id + 1, p)
-                st.session_state.polygons.append(polygon_farmer)
-                polygon_farmer.fetch_data()
-
-            st.rerun()  # Refresh the map after drawing a polygon
+                # drawings that are already registered keep their id and fetched data
+                polygon_farmer, created = registry.add(p)
+                if created:
+                    # fetch in the background, results are collected on a later run
+                    submit_fetch(polygon_farmer)
+                    added = True
+
+            if added:
+                st.rerun()  # Refresh the map after drawing a polygon
+
+        watch_pending_fetches(collect_fetch_results())
 
         # Add a submit button
         if not st.session_state.show_select_polygon_page:
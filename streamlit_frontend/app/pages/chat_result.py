@@ -1,32 +1,28 @@
 import streamlit as st
-import folium
 from typing import List
 from streamlit_folium import st_folium
 from geopy.geocoders import Nominatim
-from shapely.geometry import Point, Polygon
 from typing import Optional
+from app.map_builder import base_map, field_layer
 from app.pages.Models.Polygon_farmer import PolygonFarmer
+from app.pages.Models.Polygon_registry import PolygonRegistry
 from app.pages.chat_dashboard import polygon_details_page
+from backend.model.tracing import span
 
 
-def select_and_display_details_for_polygon():
-    def style1(selected):
-        return {
-            'fillColor': 'red',
-            'color': 'red',
-            'weight': 2
-        }
-
-    def style2(selected):
-        return {
-            'fillColor': 'blue',
-            'color': 'blue',
-            'weight': 0.5
-        }
+def polygon_registry() -> PolygonRegistry:
+    """
+    Registry of the session's polygons; st.session_state.polygons is its list of polygons.
+    """
+    if "polygon_registry" not in st.session_state:
+        st.session_state.polygon_registry = PolygonRegistry()
+        st.session_state.polygons = st.session_state.polygon_registry.polygons
+    return st.session_state.polygon_registry
+
 
+def select_and_display_details_for_polygon():
     # Ensure session state stores the polygons
-    if "polygons" not in st.session_state:
-        st.session_state.polygons = []
+    registry = polygon_registry()
     if "selected_polygon" not in st.session_state:
         st.session_state.selected_polygon: Optional[PolygonFarmer] = None
 
@@ -38,9 +34,9 @@ def select_and_display_details_for_polygon():
         sum_lat = 0
         sum_lon = 0
         for p in polygons:
-            coords = p.polygon['geometry']['coordinates'][0][0]
-            sum_lat += coords[1]
-            sum_lon += coords[0]
+            centroid_lon, centroid_lat = p.centroid
+            sum_lat += centroid_lat
+            sum_lon += centroid_lon
 
         avg_lat = sum_lat / len(polygons)
         avg_lon = sum_lon / len(polygons)
@@ -55,46 +51,46 @@ def select_and_display_details_for_polygon():
         st.title("Review Your Selected Area")
 
         lat, lon = middle
-        # Create a folium map centered on the address
-        m = folium.Map(location=[lat, lon], zoom_start=18)
-
-        # Add previously drawn polygons to the map
-        for p in st.session_state.polygons:
-            if p == st.session_state.selected_polygon:
-                folium.GeoJson(p.polygon, name="Polygon", style_function=style1).add_to(m)
-            else:
-                folium.GeoJson(p.polygon, name="Polygon", style_function=style2).add_to(m)
 
         # Center and add marker on the selected polygon if exists
+        marker = None
         if st.session_state.selected_polygon:
-            coords = st.session_state.selected_polygon.polygon['geometry']['coordinates'][0]
-            centroid_lat = sum(point[1] for point in coords) / len(coords)
-            centroid_lon = sum(point[0] for point in coords) / len(coords)
-            folium.Marker([centroid_lat, centroid_lon], popup="Selected Polygon", color="red").add_to(m)
-            m.location = [centroid_lat, centroid_lon]
-            m.zoom_start = 18
+            centroid_lon, centroid_lat = st.session_state.selected_polygon.centroid
+            marker = (centroid_lat, centroid_lon)
+            lat, lon = marker
+
+        # The base map is cached, fields are sent as a single layer that is only rebuilt when they change
+        m = base_map("review", [lat, lon])
+        fields = field_layer("review", st.session_state.polygons, st.session_state.selected_polygon, marker)
 
         # Render the map in Streamlit
-        map_data = st_folium(m, use_container_width=True, height=500)
-
-        # Handle polygon selection
-        if map_data and 'last_clicked' in map_data and map_data['last_clicked']:
-            last_clicked = map_data['last_clicked']
-            click_point = Point(last_clicked['lng'], last_clicked['lat'])
-
-            for polygon_farmer in st.session_state.polygons:
-                # Convert the polygon's coordinates to a Shapely Polygon
-                polygon_coords = polygon_farmer.polygon['geometry']['coordinates'][0]
-                polygon_shapely = Polygon(polygon_coords)
-
-                # Check if the clicked point is inside the polygon
-                if polygon_shapely.contains(click_point):
-                    if polygon_farmer == st.session_state.selected_polygon:
-                        st.session_state.selected_polygon = None
-                    else:
-                        st.session_state.selected_polygon = polygon_farmer
-
-                    st.rerun()
+        with span("map.render", page="review"):
+            map_data = st_folium(
+                m,
+                key="review_map",
+                center=[lat, lon],
+                feature_group_to_add=fields,
+                returned_objects=["last_clicked"],
+                use_container_width=True,
+                height=500,
+            )
+
+        # Handle polygon selection. The map keeps its key, so st_folium returns the last click again
+        # on every rerun; a click is only handled the first time it is seen.
+        last_clicked = map_data.get('last_clicked') if map_data else None
+        click = (last_clicked['lat'], last_clicked['lng']) if last_clicked else None
+        if click is not None and click != st.session_state.get('review_last_click'):
+            st.session_state.review_last_click = click
+
+            # Look up the clicked polygon in the spatial index
+            polygon_farmer = registry.at(last_clicked['lng'], last_clicked['lat'])
+            if polygon_farmer:
+                if polygon_farmer == st.session_state.selected_polygon:
+                    st.session_state.selected_polygon = None
+                else:
+                    st.session_state.selected_polygon = polygon_farmer
+
+                st.rerun()
 
     # Display selected polygon details below the map
     if st.session_state.selected_polygon:
@@ -3,7 +3,6 @@ import streamlit as st
 from dotenv import load_dotenv
 from openai import OpenAI
 import os
-import time
 import markdown
 from app.pages.chat_polygonSelection import create_areas_to_monitor
 
@@ -33,7 +32,7 @@ possible_function_callbacks = {
 }
 
 
-# Clean user query
+# Clean user query, yields the response text as it is generated
 def clean_user_query(user_query):
     system_prompt = '''You are an Earth Observation (EO) Assistant, specialized in making satellite data accessible and actionable for users. Your role is to bridge the gap between technical EO capabilities and practical user needs.
 
@@ -84,14 +83,16 @@ def clean_user_query(user_query):
 
     messages.append({"role": "system", "content": str(fetched_data_context)})
 
-    print(messages)
-    # Generate response
-    response = client.chat.completions.create(
+    # Generate response, streamed token by token
+    stream = client.chat.completions.create(
         model="gpt-4o",
         messages=messages,
         temperature=0.3,
-        max_tokens=200)
-    return response.choices[0].message.content
+        max_tokens=200,
+        stream=True)
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
 
 # Get assistant response
@@ -113,7 +114,53 @@ def create_message_html(html_content, style, bg_color):
             f'border-radius: 15px; max-width: 80%;">{html_content}</div></div>')
 
 
-def display_message(text, is_user, with_delay=False):
+# Markdown of finished messages is rendered once and reused on every rerun
+@st.cache_data(max_entries=1000, show_spinner=False)
+def render_markdown(text):
+    return markdown.markdown(text)
+
+
+class IncrementalMarkdown:
+    """
+    Renders a growing markdown text. Blocks that are complete (followed by a blank line outside a code fence)
+    are rendered once; only the block still being written is re-rendered on every update.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.done = 0
+        self.done_html = ""
+
+    def feed(self, delta):
+        self.text += delta
+        end = self.text.rfind("\n\n")
+        if end > self.done and self.text[:end].count("```") % 2 == 0:
+            self.done_html += render_markdown(self.text[self.done:end])
+            self.done = end
+        return self.done_html + markdown.markdown(self.text[self.done:])
+
+
+def is_function_call_prefix(text):
+    # hide responses that are (or may become) a function call
+    return "||" in text or any(name.startswith(text.strip()) for name in possible_function_callbacks)
+
+
+def stream_message(chunks):
+    """
+    Show a streamed assistant message as it arrives and return the complete text.
+    """
+    placeholder = st.empty()
+    renderer = IncrementalMarkdown()
+    text = ""
+    for delta in chunks:
+        text += delta
+        html_content = renderer.feed(delta)
+        if not is_function_call_prefix(text):
+            placeholder.markdown(create_message_html(html_content, "flex-start", "#0e1117"), unsafe_allow_html=True)
+    return text
+
+
+def display_message(text, is_user):
     if type(text) is type(()):
         if text[1] == "create_areas_to_monitor":
             create_areas_to_monitor(text[2])
@@ -121,33 +168,8 @@ def display_message(text, is_user, with_delay=False):
         style = "flex-end" if is_user else "flex-start"
         bg_color = "#2b313e" if is_user else "#0e1117"
 
-        if not with_delay:
-            html_content = markdown.markdown(text)
-            st.markdown(create_message_html(html_content, style, bg_color), unsafe_allow_html=True)
-            return
-
-        # Split text into lines first to preserve markdown formatting
-        lines = text.split('\n')
-        placeholder = st.empty()
-        displayed_lines = []
-
-        for line in lines:
-            # For each line, split into words and display progressively
-            words = line.split()
-            for i in range(len(words)):
-                current_line = ' '.join(words[:i + 1])
-                # Combine with previously displayed lines
-                current_text = '\n'.join(displayed_lines + [current_line])
-                html_content = markdown.markdown(current_text)
-
-                placeholder.markdown(
-                    create_message_html(html_content, style, bg_color),
-                    unsafe_allow_html=True
-                )
-                time.sleep(0.03)
-
-            # After completing a line, add it to displayed lines
-            displayed_lines.append(line)
+        html_content = render_markdown(text)
+        st.markdown(create_message_html(html_content, style, bg_color), unsafe_allow_html=True)
 
 
 def main():
@@ -190,22 +212,16 @@ def main():
         for message in st.session_state.messages:
             display_message(message['content'], message['is_user'])
 
-        # Add spinner while processing response
-        with st.spinner(''):
-            # Process the response
-            ai_resp = clean_user_query(current_query)
-            response = get_assistant_response(ai_resp)
-
-            # Add assistant's response to messages
-            st.session_state.messages.append({"content": response, "is_user": False})
+        # Stream the response as it is generated
+        ai_resp = stream_message(clean_user_query(current_query))
+        response = get_assistant_response(ai_resp)
 
-            # Display the AI response with delay effect
-            display_message(response, False, with_delay=True)
+        # Add assistant's response to messages
+        st.session_state.messages.append({"content": response, "is_user": False})
 
-            # Clear current query and rerun
-            st.session_state.pop('current_query', None)
-            time.sleep(0.5)  # Small pause before rerun
-            st.rerun()
+        # Clear current query and rerun
+        st.session_state.pop('current_query', None)
+        st.rerun()
     else:
         # Display existing messages when no new query
         for message in st.session_state.messages:
@@ -0,0 +1,155 @@
+import json
+import os
+
+from backend.model.geometry import geometry_key
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # GeoParquet input is optional
+    pq = None
+
+# Characters read from a GeoJSON file at a time
+READ_SIZE = 1 << 20
+# Rows decoded from a GeoParquet file at a time
+PARQUET_BATCH_SIZE = 1024
+
+GEOJSON_SEQ_SUFFIXES = (".geojsonl", ".geojsons", ".geojsonseq", ".ndjson", ".jsonl")
+PARQUET_SUFFIXES = (".parquet", ".geoparquet")
+POLYGON_TYPES = ("Polygon", "MultiPolygon")
+
+
+class Field:
+    """
+    A field read from a catalog. index is its position in the input, coordinates the GeoJSON coordinates of
+    its (multi)polygon, or None if the geometry can not be scored.
+    """
+
+    __slots__ = ("index", "field_id", "coordinates")
+
+    def __init__(self, index, field_id, coordinates):
+        self.index = index
+        self.field_id = field_id
+        self.coordinates = coordinates
+
+
+def _field(index, feature):
+    geometry = feature.get("geometry") or {}
+    coordinates = geometry.get("coordinates") if geometry.get("type") in POLYGON_TYPES else None
+    properties = feature.get("properties") or {}
+    field_id = feature.get("id", properties.get("field_id", properties.get("id")))
+    if field_id is None and coordinates:
+        field_id = geometry_key(coordinates)
+    return Field(index, field_id, coordinates)
+
+
+def _skip_whitespace(buffer, position):
+    while position < len(buffer) and buffer[position] in " \t\r\n":
+        position += 1
+    return position
+
+
+def iter_geojson_features(file, read_size=READ_SIZE):
+    """
+    Features of a GeoJSON FeatureCollection, decoded one at a time from a text file so that only the
+    current feature and one read buffer are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = file.read(read_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    # Skip to the opening bracket of the "features" array
+    while True:
+        start = buffer.find('"features"', position)
+        if start >= 0:
+            bracket = buffer.find("[", start)
+            if bracket >= 0:
+                position = bracket + 1
+                break
+            position = start
+        else:
+            # keep a tail in case the key is split across reads
+            position = max(position, len(buffer) - len('"features"'))
+        if eof:
+            raise ValueError("No \"features\" array found in the GeoJSON input")
+        fill()
+
+    while True:
+        position = _skip_whitespace(buffer, position)
+        if position < len(buffer) and buffer[position] == ",":
+            position = _skip_whitespace(buffer, position + 1)
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            feature, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # the feature continues in the next read
+            if eof:
+                raise
+            fill()
+            continue
+        position = end
+        yield feature
+
+
+def iter_geojson_seq_features(file):
+    """
+    Features of a GeoJSON text sequence or newline-delimited GeoJSON file, one per line.
+    """
+    for line in file:
+        # GeoJSON text sequences prefix every record with an ASCII record separator
+        line = line.strip().lstrip("\x1e")
+        if line:
+            yield json.loads(line)
+
+
+def iter_geoparquet_features(path, batch_size=PARQUET_BATCH_SIZE):
+    """
+    Features of a GeoParquet file, read batch by batch. Requires pyarrow.
+    """
+    if pq is None:
+        raise ImportError("Reading GeoParquet requires pyarrow (pip install pyarrow)")
+    from shapely import from_wkb
+    from shapely.geometry import mapping
+
+    parquet_file = pq.ParquetFile(path)
+    metadata = json.loads((parquet_file.schema_arrow.metadata or {}).get(b"geo", b"{}"))
+    geometry_column = metadata.get("primary_column", "geometry")
+    id_column = next((name for name in ("field_id", "id") if name in parquet_file.schema_arrow.names), None)
+    columns = [geometry_column] + ([id_column] if id_column else [])
+
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        ids = batch.column(id_column).to_pylist() if id_column else [None] * batch.num_rows
+        for wkb, field_id in zip(batch.column(geometry_column).to_pylist(), ids):
+            geometry = mapping(from_wkb(wkb)) if wkb is not None else None
+            yield {"type": "Feature", "id": field_id, "geometry": geometry, "properties": {}}
+
+
+def read_fields(path):
+    """
+    Stream the fields of a GeoJSON FeatureCollection, GeoJSON sequence or GeoParquet file, picked by extension.
+    The id of a field is the feature id, its field_id or id property, or the geometry key.
+    :param path: Path of the catalog
+    :return: Generator of Field in input order
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in PARQUET_SUFFIXES:
+        features = iter_geoparquet_features(path)
+        for index, feature in enumerate(features):
+            yield _field(index, feature)
+        return
+
+    with open(path, encoding="utf-8") as file:
+        if suffix in GEOJSON_SEQ_SUFFIXES:
+            features = iter_geojson_seq_features(file)
+        else:
+            features = iter_geojson_features(file)
+        for index, feature in enumerate(features):
+            yield _field(index, feature)
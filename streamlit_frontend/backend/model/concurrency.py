@@ -0,0 +1,49 @@
+import threading
+from contextlib import contextmanager
+
+SENTINEL_HOST = "services.sentinel-hub.com"
+OPENWEATHER_HOST = "api.openweathermap.org"
+
+# Maximum number of requests in flight per upstream host, shared by all threads of the process
+host_limits = {
+    SENTINEL_HOST: 4,
+    OPENWEATHER_HOST: 8,
+}
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def set_host_limit(host, limit):
+    """
+    Change the concurrency limit of a host. Requests already holding a slot are not affected.
+    :param host: Host name, e.g. SENTINEL_HOST
+    :param limit: Maximum number of simultaneous requests
+    """
+    if limit < 1:
+        raise ValueError("The host limit must be at least 1.")
+    with _semaphores_lock:
+        host_limits[host] = limit
+        _semaphores.pop(host, None)
+
+
+def _get_semaphore(host):
+    with _semaphores_lock:
+        semaphore = _semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(host_limits.get(host, 4))
+            _semaphores[host] = semaphore
+        return semaphore
+
+
+@contextmanager
+def host_slot(host):
+    """
+    Block until a request slot for the given host is free and hold it for the duration of the block.
+    """
+    semaphore = _get_semaphore(host)
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
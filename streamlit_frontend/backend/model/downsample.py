@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a line.
+    Keeps the first and last point and, for every bucket in between, the point forming the largest triangle
+    with the previously kept point and the average of the next bucket, which preserves the visual shape.
+    :param x: Increasing x values (e.g. timestamps as numbers)
+    :param y: y values, NaN points are dropped
+    :param n_out: Number of points to keep
+    :return: Indices of the kept points into x and y
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(y))
+    if n_out >= len(valid):
+        return valid
+    if n_out < 3:
+        return valid[[0, -1]][:max(n_out, 0)]
+
+    xs, ys = x[valid], y[valid]
+    n = len(xs)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+
+    kept = np.empty(n_out, dtype=np.intp)
+    kept[0] = 0
+    kept[-1] = n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # average of the next bucket, the last point for the final bucket
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = xs[next_start:next_end].mean()
+        next_y = ys[next_start:next_end].mean()
+
+        area = np.abs(
+            (xs[previous] - next_x) * (ys[start:end] - ys[previous])
+            - (xs[previous] - xs[start:end]) * (next_y - ys[previous])
+        )
+        previous = start + int(np.argmax(area))
+        kept[i + 1] = previous
+    return valid[kept]
@@ -0,0 +1,83 @@
+import numpy as np
+
+# Column order of the raw indicator arrays passed to predict_batch
+INPUT_COLUMNS = ["NDVI Index", "EVI Index", "Moisture Stress", "rain_presence"]
+
+# NDVI above this value means vegetation is present
+VEGETATION_THRESHOLD = 0.2
+# EVI above this value means the vegetation is healthy
+HEALTH_THRESHOLD = 0.2
+
+# Moisture Stress: -1 < dry <= 0 < low <= 0.2 < moderate <= 0.4 < high
+MOISTURE_LEVELS = ["Dry", "Low", "Moderate", "High"]
+MOISTURE_BINS = np.array([0.0, 0.2, 0.4])
+
+
+def bin_indicators(values):
+    """
+    Bin raw indicator values into the categorical levels the model was trained on.
+    :param values: Array-like of shape (n, 4) with the INPUT_COLUMNS per row, a single row is also accepted
+    :return:
+    Tuple of arrays (is_vegetation, not_healthy, moisture_level, rain_presence) of length n.
+    moisture_level holds indices into MOISTURE_LEVELS, the other arrays are booleans.
+    NaN indicators (no valid pixels) fall into the negative class, like the scalar comparisons did.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values.reshape(1, -1)
+    ndvi, evi, moisture_stress, rain = values.T
+
+    is_vegetation = ndvi > VEGETATION_THRESHOLD
+    not_healthy = ~(evi > HEALTH_THRESHOLD)
+    moisture_level = np.digitize(moisture_stress, MOISTURE_BINS, right=True)
+    moisture_level[np.isnan(moisture_stress)] = 0
+    rain_presence = rain > 0
+
+    return is_vegetation, not_healthy, moisture_level, rain_presence
+
+
+def encode_features(binned, feature_names):
+    """
+    One-hot encode binned indicators into a feature matrix matching the training columns.
+    The training data was encoded with pd.get_dummies(drop_first=True), so "Healthy" and "Dry" have no column.
+    :param binned: Tuple returned by bin_indicators
+    :param feature_names: Column names of the fitted model (model.feature_names_in_)
+    :return: Float matrix of shape (n, len(feature_names)), unknown columns are left at 0
+    """
+    is_vegetation, not_healthy, moisture_level, rain_presence = binned
+
+    columns = {
+        "is_vegetation": is_vegetation,
+        "rain_presence": rain_presence,
+        "vegetation_health_Not Healthy": not_healthy,
+    }
+    for level, name in enumerate(MOISTURE_LEVELS):
+        columns[f"moisture_index_{name}"] = moisture_level == level
+
+    matrix = np.zeros((len(moisture_level), len(feature_names)), dtype=np.float64)
+    for j, name in enumerate(feature_names):
+        column = columns.get(name)
+        if column is not None:
+            matrix[:, j] = column
+    return matrix
+
+
+# Every categorical input the model can see: is_vegetation x not_healthy x moisture_level x rain_presence
+INPUT_SHAPE = (2, 2, len(MOISTURE_LEVELS), 2)
+
+
+def combination_codes(binned):
+    """
+    Map binned indicators to a single integer per row, in the range [0, prod(INPUT_SHAPE)).
+    :param binned: Tuple returned by bin_indicators
+    :return: Int array of length n
+    """
+    return np.ravel_multi_index(tuple(np.asarray(b, dtype=np.intp) for b in binned), INPUT_SHAPE)
+
+
+def all_combinations():
+    """
+    Binned indicators for every possible categorical input, ordered by combination_codes.
+    :return: Tuple in the format of bin_indicators
+    """
+    return tuple(axis.ravel() for axis in np.indices(INPUT_SHAPE))
@@ -0,0 +1,133 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from geopy.geocoders import Nominatim
+
+from backend.model.singleflight import SingleFlight
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.getenv("GEOCODE_CACHE", os.path.join(BACKEND_DIR, "output", "geocode.sqlite"))
+
+USER_AGENT = "streamlit_app"
+# Nominatim usage policy: at most one request per second
+MIN_INTERVAL = 1.0
+# Seconds before a query that found nothing is looked up again
+NOT_FOUND_TTL = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    query TEXT PRIMARY KEY,
+    lat REAL,
+    lon REAL,
+    looked_up_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_limit (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    last_request REAL NOT NULL
+);
+"""
+
+_memory = {}
+_flight = SingleFlight()
+_geolocator = None
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def normalize_query(query):
+    """
+    Cache key of a location query: case-folded, with collapsed whitespace and uniform comma spacing.
+    """
+    query = re.sub(r"\s+", " ", query.strip().casefold())
+    query = re.sub(r"\s*,\s*", ", ", query)
+    return query.strip(" ,.")
+
+
+def _connect():
+    global _initialized
+    with _init_lock:
+        if not _initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(CACHE_PATH)), exist_ok=True)
+            connection = sqlite3.connect(CACHE_PATH, timeout=60)
+            connection.executescript(SCHEMA)
+            connection.close()
+            _initialized = True
+    return sqlite3.connect(CACHE_PATH, timeout=60, isolation_level=None)
+
+
+def _read_cache(key):
+    connection = _connect()
+    try:
+        row = connection.execute("SELECT lat, lon, looked_up_at FROM geocode WHERE query = ?", (key,)).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return False, None
+    lat, lon, looked_up_at = row
+    if lat is None:
+        # remembered miss
+        if time.time() - looked_up_at > NOT_FOUND_TTL:
+            return False, None
+        return True, None
+    return True, (lat, lon)
+
+
+def _wait_for_rate_limit():
+    # The last request time lives in the cache database, so the limit holds for every process sharing it.
+    # BEGIN IMMEDIATE takes the write lock, which serializes the callers while they wait.
+    connection = _connect()
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        row = connection.execute("SELECT last_request FROM rate_limit WHERE id = 0").fetchone()
+        if row is not None:
+            delay = row[0] + MIN_INTERVAL - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        connection.execute("INSERT OR REPLACE INTO rate_limit VALUES (0, ?)", (time.time(),))
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+
+def _lookup(key, query):
+    found, coordinates = _read_cache(key)
+    if found:
+        return coordinates
+
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = Nominatim(user_agent=USER_AGENT)
+
+    _wait_for_rate_limit()
+    location = _geolocator.geocode(query)
+    coordinates = (location.latitude, location.longitude) if location else None
+
+    connection = _connect()
+    try:
+        connection.execute(
+            "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?)",
+            (key, *(coordinates or (None, None)), time.time()),
+        )
+    finally:
+        connection.close()
+    return coordinates
+
+
+def geocode(query):
+    """
+    (latitude, longitude) of a location query, or None if Nominatim does not know it.
+    Results are cached in memory and on disk, concurrent lookups of the same query share one request,
+    and requests to Nominatim are rate limited.
+    """
+    key = normalize_query(query)
+    if key in _memory:
+        return _memory[key]
+
+    coordinates = _flight.do(key, _lookup, key, query)
+    if coordinates is not None:
+        # misses expire, so they are only remembered on disk
+        _memory[key] = coordinates
+    return coordinates
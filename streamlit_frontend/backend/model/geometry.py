@@ -0,0 +1,241 @@
+import hashlib
+import json
+from itertools import chain
+
+import numpy as np
+
+from backend.model.zonal import polygon_rings
+
+# Decimal places kept when identifying geometries, 6 places are about 0.1 m
+KEY_PRECISION = 6
+
+# WGS84 semi-major axis in meters and eccentricity
+WGS84_A = 6378137.0
+WGS84_E = 0.0818191908426215
+
+
+def _normalize_ring(ring, precision):
+    points = [(round(float(lon), precision), round(float(lat), precision)) for lon, lat, *_ in ring]
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+
+    # counter-clockwise orientation, starting at the smallest vertex
+    signed_area = sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]))
+    if signed_area < 0:
+        points.reverse()
+    start = points.index(min(points)) if points else 0
+    return points[start:] + points[:start]
+
+
+def geometry_key(polygon_coords, precision=KEY_PRECISION):
+    """
+    Stable identifier of a polygon geometry. Coordinates are rounded to precision decimals and every ring
+    is normalized for orientation and starting vertex, so redrawn or re-serialized copies of the same
+    shape get the same key.
+    :param polygon_coords: Ring, polygon or multipolygon coordinates as [longitude, latitude] pairs
+    :return: Hex string
+    """
+    rings = [_normalize_ring(ring, precision) for ring in polygon_rings(polygon_coords)]
+    payload = json.dumps(rings, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.number))
+
+
+def _is_sequence(value):
+    return isinstance(value, (list, tuple, np.ndarray))
+
+
+def _polygon_parts(polygon_coords):
+    # Split ring, polygon or multipolygon coordinates into polygons given as lists of rings
+    if not _is_sequence(polygon_coords):
+        raise ValueError(f"Expected nested lists of [longitude, latitude] pairs, got {type(polygon_coords).__name__}")
+    if len(polygon_coords) == 0:
+        return []
+    # depth of the nesting: a ring's first element is a point, a polygon's first element is a ring
+    first = polygon_coords[0]
+    if _is_sequence(first) and len(first) > 0 and _is_number(first[0]):
+        return [[polygon_coords]]
+    if _is_sequence(first) and len(first) > 0 and _is_sequence(first[0]) and len(first[0]) > 0 \
+            and _is_number(first[0][0]):
+        return [polygon_coords]
+    return [rings for part in polygon_coords for rings in _polygon_parts(part)]
+
+
+class PolygonArrays:
+    """
+    Many polygons packed into flat NumPy arrays, so bounding boxes, centroids and areas of all of them
+    are computed in a single vectorized pass.
+    coords holds the [longitude, latitude] vertices of every ring back to back, ring_offsets[i]:ring_offsets[i + 1]
+    are the vertices of ring i, ring_polygon is the index of the polygon a ring belongs to and ring_hole marks
+    interior rings. The parts of a multipolygon belong to the same polygon.
+    """
+
+    def __init__(self, coords, ring_offsets, ring_polygon, ring_hole, n_polygons):
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.ring_polygon = ring_polygon
+        self.ring_hole = ring_hole
+        self.n_polygons = n_polygons
+
+        lengths = np.diff(ring_offsets)
+        self.point_ring = np.repeat(np.arange(len(lengths)), lengths)
+        self.point_polygon = ring_polygon[self.point_ring]
+        # index of the following vertex, wrapping around at the end of every ring
+        self.next_point = np.arange(1, len(coords) + 1)
+        self.next_point[ring_offsets[1:] - 1] = ring_offsets[:-1]
+        # first vertex of every polygon; the rings of a polygon are stored contiguously
+        self.polygon_start = ring_offsets[np.searchsorted(ring_polygon, np.arange(n_polygons))]
+
+    @classmethod
+    def from_coords(cls, polygons):
+        """
+        Pack a list of polygons.
+        :param polygons: List of ring, polygon or multipolygon coordinates as [longitude, latitude] pairs
+        :return: PolygonArrays
+        """
+        rings, ring_polygon, ring_hole = [], [], []
+        for i, polygon_coords in enumerate(polygons):
+            n_rings = len(rings)
+            for part in _polygon_parts(polygon_coords):
+                for j, ring in enumerate(part):
+                    if len(ring) == 0:
+                        continue
+                    rings.append(ring)
+                    ring_polygon.append(i)
+                    ring_hole.append(j > 0)
+            if len(rings) == n_rings:
+                raise ValueError("The polygon must have at least one vertex.")
+
+        ring_offsets = np.zeros(len(rings) + 1, dtype=np.intp)
+        np.cumsum([len(ring) for ring in rings], out=ring_offsets[1:])
+        try:
+            # one conversion for all vertices
+            coords = np.array(list(chain.from_iterable(rings)), dtype=np.float64).reshape(ring_offsets[-1], -1)
+        except ValueError:
+            # vertices of mixed length
+            coords = np.array([point[:2] for ring in rings for point in ring], dtype=np.float64)
+        # drop altitudes
+        coords = np.ascontiguousarray(coords[:, :2]) if rings else np.empty((0, 2))
+        return cls(coords, ring_offsets, np.asarray(ring_polygon, dtype=np.intp),
+                   np.asarray(ring_hole, dtype=bool), len(polygons))
+
+    def __len__(self):
+        return self.n_polygons
+
+    def bounds(self):
+        """
+        :return: Array of shape (n, 4) with [min_lon, min_lat, max_lon, max_lat] per polygon
+        """
+        if self.n_polygons == 0:
+            return np.empty((0, 4))
+        return np.hstack([
+            np.minimum.reduceat(self.coords, self.polygon_start),
+            np.maximum.reduceat(self.coords, self.polygon_start),
+        ])
+
+    def centroids(self):
+        """
+        Planar area-weighted centroids in degrees. Holes are subtracted whatever the orientation of the rings,
+        and polygons without area fall back to the mean of their vertices.
+        :return: Array of shape (n, 2) with the (longitude, latitude) of every polygon
+        """
+        n = self.n_polygons
+        # relative to the first vertex of the polygon to keep the cross products well conditioned
+        origin = self.coords[self.polygon_start]
+        start = self.coords - origin[self.point_polygon]
+        end = self.coords[self.next_point] - origin[self.point_polygon]
+        cross = start[:, 0] * end[:, 1] - end[:, 0] * start[:, 1]
+
+        ring_area = np.bincount(self.point_ring, cross, len(self.ring_polygon))
+        ring_sign = np.sign(ring_area) * np.where(self.ring_hole, -1.0, 1.0)
+        weights = cross * ring_sign[self.point_ring]
+
+        area = np.bincount(self.point_polygon, weights, n)
+        centroids = np.empty((n, 2))
+        for axis in range(2):
+            moment = np.bincount(self.point_polygon, (start[:, axis] + end[:, axis]) * weights, n)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                centroids[:, axis] = moment / (3 * area)
+
+        degenerate = area == 0
+        if degenerate.any():
+            counts = np.bincount(self.point_polygon, minlength=n)
+            for axis in range(2):
+                mean = np.bincount(self.point_polygon, start[:, axis], n) / np.maximum(counts, 1)
+                centroids[degenerate, axis] = mean[degenerate]
+        return centroids + origin
+
+    def areas(self):
+        """
+        Areas on the WGS84 ellipsoid. Every edge is integrated in the ellipsoid's equal-area cylindrical projection
+        (authalic latitude), which differs from the geodesic area only by the shape of the edges, about 0.01 % for
+        fields of a few kilometers.
+        :return: Array with the area of every polygon in square meters
+        """
+        lon = np.radians(self.coords[:, 0])
+        q = _authalic_q(np.sin(np.radians(self.coords[:, 1])))
+        # longitude steps are wrapped into [-pi, pi) so rings crossing the antimeridian are measured correctly
+        d_lon = (lon[self.next_point] - lon + np.pi) % (2 * np.pi) - np.pi
+        terms = d_lon * (q + q[self.next_point])
+
+        ring_area = np.abs(np.bincount(self.point_ring, terms, len(self.ring_polygon))) * WGS84_A ** 2 / 4
+        return np.bincount(self.ring_polygon, np.where(self.ring_hole, -ring_area, ring_area), self.n_polygons)
+
+
+def _authalic_q(sin_lat):
+    # q(latitude) of the authalic latitude; the equal-area projection maps a latitude to y = a^2 * q / 2
+    e_sin = WGS84_E * sin_lat
+    return (1 - WGS84_E ** 2) * (sin_lat / (1 - e_sin ** 2) - np.log((1 - e_sin) / (1 + e_sin)) / (2 * WGS84_E))
+
+
+def validate_polygon(polygon_coords):
+    """
+    Check that coordinates describe a usable ring, polygon or multipolygon: numeric [longitude, latitude]
+    pairs, at least 3 distinct vertices per ring and a nonzero area for every polygon.
+    :raises ValueError: Describing the first problem found
+    """
+    parts = _polygon_parts(polygon_coords)
+    if not parts:
+        raise ValueError("The polygon has no coordinates.")
+    for rings in parts:
+        for j, ring in enumerate(rings):
+            points = []
+            for point in ring:
+                if not _is_sequence(point) or len(point) < 2 or not all(_is_number(value) for value in point[:2]):
+                    raise ValueError(f"Expected [longitude, latitude] pairs, got {point!r}")
+                lon, lat = float(point[0]), float(point[1])
+                if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+                    raise ValueError(f"Coordinates out of range: {point!r}")
+                points.append((lon, lat))
+            if len(set(points)) < 3:
+                raise ValueError("Every ring needs at least 3 distinct vertices.")
+            if j == 0:
+                # shoelace formula on the exterior ring, degrees are enough to tell zero from nonzero
+                area = sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]))
+                if area == 0:
+                    raise ValueError("The polygon has no area.")
+
+
+def polygon_bbox(polygon_coords):
+    """
+    Bounding box of a ring, a polygon with holes or a multipolygon as [min_lon, min_lat, max_lon, max_lat].
+    """
+    return PolygonArrays.from_coords([polygon_coords]).bounds()[0].tolist()
+
+
+def polygon_centroid(polygon_coords):
+    """
+    (longitude, latitude) of the centroid of a ring, a polygon with holes or a multipolygon.
+    """
+    lon, lat = PolygonArrays.from_coords([polygon_coords]).centroids()[0].tolist()
+    return lon, lat
+
+
+def polygon_area(polygon_coords):
+    """
+    Geodesic area of a ring, a polygon with holes or a multipolygon in square meters.
+    """
+    return float(PolygonArrays.from_coords([polygon_coords]).areas()[0])
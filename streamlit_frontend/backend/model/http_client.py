@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.model.concurrency import host_slot
+
+# Seconds to wait for the connection and for the response
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Consecutive failures after which a host is considered unhealthy, and seconds until it is tried again
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised without contacting the host while its circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after BREAKER_THRESHOLD consecutive failures and rejects calls until the cooldown has passed.
+    The first call after the cooldown is let through as a probe; its outcome closes or reopens the breaker.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                # half-open: let one probe through and hold the others back for another cooldown
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+class HttpClient:
+    """
+    Shared HTTP client with a pooled keep-alive session, timeouts, jittered exponential backoff
+    on 429/5xx and connection errors, and one circuit breaker per host.
+    """
+
+    def __init__(self, pool_size=16, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_retries=MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+
+    def _breaker(self, host):
+        with self._breakers_lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker()
+                self._breakers[host] = breaker
+            return breaker
+
+    @staticmethod
+    def _backoff(attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+        # full jitter
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def get(self, url, params=None):
+        """
+        GET url and return the response, raising requests exceptions for errors that persist after retrying.
+        """
+        host = urlsplit(url).hostname
+        breaker = self._breaker(host)
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} is failing, not sending requests for now")
+
+            retry_after = None
+            try:
+                with host_slot(host):
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    breaker.record_success()
+                    response.raise_for_status()
+                    return response
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                retry_after = response.headers.get("Retry-After")
+
+            time.sleep(self._backoff(attempt, retry_after))
+
+    def get_json(self, url, params=None):
+        return self.get(url, params=params).json()
+
+
+client = HttpClient()
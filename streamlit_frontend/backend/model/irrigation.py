@@ -1,16 +1,32 @@
-from backend.model.scrap_sentinel import get_data
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sentinelhub import MimeType
+
+from backend.model.geometry import PolygonArrays
+from backend.model.scrap_sentinel import get_data, get_data_for_bbox, polygon_to_bbox
+from backend.model.tiles import plan_tiles
+from backend.model.tracing import span
+from backend.model.zonal import label_image, masked_stats, overlapped_zones, polygon_mask, zonal_stats, zone_row
 from datetime import datetime, timedelta
 
-today = datetime.today()
 
-ten_days_ago = today - timedelta(days=10)
+def last_days(days=10):
+    """
+    (start_date, end_date) of the last days up to today as YYYY-MM-DD strings.
+    """
+    today = datetime.today()
+    start = today - timedelta(days=days)
+    return start.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
 
-time_interval = (ten_days_ago.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d"))
+
+time_interval = last_days(10)
 
 indicators = [
     {
         # Tells us if area is dry or wet
         "name": "Moisture Index",
+        "id": "ndmi",
         "qname": "Normalized Difference Moisture Index (NDMI)",
         "evalscript": """
 
@@ -61,6 +77,7 @@ indicators = [
     {
         # Tells us if vegetation is healthy or not
         "name": "EVI Index",
+        "id": "evi",
         "qname": "Enhanced Vegetation Index (EVI)",
         "evalscript": """
 
@@ -131,6 +148,7 @@ indicators = [
     {
         # Tells us if vegetation is present or not
         "name": "NDVI Index",
+        "id": "ndvi",
         "qname": "Normalized Difference Vegetation Index (NDVI)",
         "evalscript": """
                 //VERSION=3
@@ -217,6 +235,7 @@ indicators = [
     {
         # Tells us if area is dry and needs water
         "name": "Moisture Stress",
+        "id": "moisture_stress",
         "qname": "NDMI for Moisture Stress",
         "evalscript": """
                 //VERSION=3
@@ -267,20 +286,240 @@ indicators = [
 ]
 
 
-def fetch_sentinel_data(polygon_coords):
+# Evaluates all indicators above in one pass, so a polygon costs a single request.
+# Every indicator gets its own "<id>_default" preview and "<id>_index" value output,
+# plus a shared "cloud" mask used for the zonal statistics.
+combined_evalscript = """
+                //VERSION=3
+                const moistureRamps = [
+                [-0.8, 0x800000],
+                [-0.24, 0xff0000],
+                [-0.032, 0xffff00],
+                [0.032, 0x00ffff],
+                [0.24, 0x0000ff],
+                [0.8, 0x000080],
+                ];
+
+                const viz = new ColorRampVisualizer(moistureRamps);
+
+                // Shared upper part of the EVI and NDVI color tables
+                const vegetationSteps = [
+                [0.025, [1, 0.98, 0.8]],
+                [0.05, [0.93, 0.91, 0.71]],
+                [0.075, [0.87, 0.85, 0.61]],
+                [0.1, [0.8, 0.78, 0.51]],
+                [0.125, [0.74, 0.72, 0.42]],
+                [0.15, [0.69, 0.76, 0.38]],
+                [0.175, [0.64, 0.8, 0.35]],
+                [0.2, [0.57, 0.75, 0.32]],
+                [0.25, [0.5, 0.7, 0.28]],
+                [0.3, [0.44, 0.64, 0.25]],
+                [0.35, [0.38, 0.59, 0.21]],
+                [0.4, [0.31, 0.54, 0.18]],
+                [0.45, [0.25, 0.49, 0.14]],
+                [0.5, [0.19, 0.43, 0.11]],
+                [0.55, [0.13, 0.38, 0.07]],
+                [0.6, [0.06, 0.33, 0.04]],
+                ];
+
+                const eviSteps = [
+                [-1.1, [0, 0, 0]],
+                [-0.2, [0.75, 0.75, 1]],
+                [-0.1, [0.86, 0.86, 0.86]],
+                [0, [1, 1, 0.88]],
+                ].concat(vegetationSteps);
+
+                const ndviSteps = [
+                [-0.5, [0.05, 0.05, 0.05]],
+                [-0.2, [0.75, 0.75, 0.75]],
+                [-0.1, [0.86, 0.86, 0.86]],
+                [0, [0.92, 0.92, 0.92]],
+                ].concat(vegetationSteps);
+
+                function setup() {
+                return {
+                    input: ["B02", "B03", "B04", "B08", "B8A", "B11", "dataMask"],
+                    output: [
+                    { id: "ndmi_default", bands: 4 },
+                    { id: "ndmi_index", bands: 1, sampleType: "FLOAT32" },
+                    { id: "evi_default", bands: 4 },
+                    { id: "evi_index", bands: 1, sampleType: "FLOAT32" },
+                    { id: "ndvi_default", bands: 4 },
+                    { id: "ndvi_index", bands: 1, sampleType: "FLOAT32" },
+                    { id: "moisture_stress_default", bands: 4 },
+                    { id: "moisture_stress_index", bands: 1, sampleType: "FLOAT32" },
+                    { id: "cloud", bands: 1, sampleType: "UINT8" },
+                    ],
+                };
+                }
+
+                function stepColor(val, steps) {
+                for (let i = 0; i < steps.length; i++) {
+                    if (val < steps[i][0]) return steps[i][1];
+                }
+                return [0, 0.27, 0];
+                }
+
+                function stressColor(val) {
+                if (val <= 0) return [1, 1, 1];
+                else if (val <= 0.2) return [0, 0.8, 0.9];
+                else if (val <= 0.4) return [0, 0.5, 0.9];
+                return [0, 0, 0.7];
+                }
+
+                function isCloud(samples) {
+                const NGDR = index(samples.B03, samples.B04);
+                const bRatio = (samples.B03 - 0.175) / (0.39 - 0.175);
+                return bRatio > 1 || (bRatio > 0 && NGDR > 0);
+                }
+
+                function evaluatePixel(samples) {
+                const valid = samples.dataMask === 1;
+                const mask = samples.dataMask;
+
+                let ndmi = index(samples.B8A, samples.B11);
+                let evi =
+                    (2.5 * (samples.B08 - samples.B04)) /
+                    (samples.B08 + 6.0 * samples.B04 - 7.5 * samples.B02 + 1.0);
+                let ndvi = index(samples.B08, samples.B04);
+                let stress = (samples.B08 - samples.B11) / (samples.B08 + samples.B11);
+
+                // The library for tiffs works well only if there is only one channel returned.
+                // So we encode the "no data" as NaN here and ignore NaNs on frontend.
+                // We limit the EVI value to [-1 , 1] as the EVI mostly falls in that range
+                return {
+                    ndmi_default: [...viz.process(ndmi), mask],
+                    ndmi_index: [valid ? ndmi : NaN],
+                    evi_default: [...stepColor(evi, eviSteps), mask],
+                    evi_index: [valid && evi >= -1 && evi <= 1 ? evi : NaN],
+                    ndvi_default: [...stepColor(ndvi, ndviSteps), mask],
+                    ndvi_index: [valid ? ndvi : NaN],
+                    moisture_stress_default: [...stressColor(stress), mask],
+                    moisture_stress_index: [valid ? stress : NaN],
+                    cloud: [valid && isCloud(samples) ? 1 : 0],
+                };
+                }
+            """
+
 
-    results = {}
+def _combined_responses():
+    responses = [("cloud", MimeType.TIFF)]
+    for indicator in indicators:
+        responses.append((f"{indicator['id']}_default", MimeType.PNG))
+        responses.append((f"{indicator['id']}_index", MimeType.TIFF))
+    return responses
+
+
+def fetch_sentinel_stats(polygon_coords, interval=None):
+    """
+    Fetch all indicators for a polygon and reduce them over the pixels inside the polygon.
+    :param polygon_coords: List of coordinates of the polygon
+    :param interval: (start_date, end_date) to fetch, the last ten days if not given
+    :return:
+    Tuple (stats, images), both keyed by indicator name. stats holds the backend.model.zonal statistics
+    of the indicator, images the preview image.
+    """
+    stats = {}
     images = {}
 
+    # One request returns a preview and an index raster for every indicator
+    data = get_data(polygon_coords, interval or time_interval, combined_evalscript, responses=_combined_responses())
+
+    # get_data requests exactly the polygon's bounding box, so the mask is computed on that grid
+    cloud = data["cloud.tif"]
+    with span("geometry.mask") as mask_span:
+        mask = polygon_mask(polygon_coords, polygon_to_bbox(polygon_coords), cloud.shape)
+        mask_span.set(pixels=cloud.size)
+
     for indicator in indicators:
         indicator_name = indicator["name"]
-        indicator_qname = indicator["qname"]
-        evalscript = indicator["evalscript"]
-        data = get_data(polygon_coords, time_interval, evalscript)
-        image = data["default.png"]
-        index = data["index.tif"].mean()
-        results[indicator_name] = index
-        images[indicator_name] = image
+        with span("zonal.stats", indicator=indicator["id"]) as stats_span:
+            stats[indicator_name] = masked_stats(data[f"{indicator['id']}_index.tif"], mask, cloud)
+            stats_span.set(pixels=cloud.size)
+        images[indicator_name] = data[f"{indicator['id']}_default.png"]
+
+    return stats, images
+
+
+def fetch_tile_stats(bbox, polygons, interval=None):
+    """
+    Fetch all indicators for a tile once and split the statistics out per polygon with a label image.
+    :param bbox: Tile extent as [min_lon, min_lat, max_lon, max_lat], covering all polygons
+    :param polygons: Coordinates of the polygons inside the tile
+    :param interval: (start_date, end_date) to fetch, the last ten days if not given
+    :return: List with a (stats, images) tuple per polygon, in the format of fetch_sentinel_stats
+    """
+    data = get_data_for_bbox(bbox, interval or time_interval, combined_evalscript, responses=_combined_responses())
+
+    cloud = data["cloud.tif"]
+    with span("geometry.labels") as labels_span:
+        labels = label_image(polygons, bbox, cloud.shape)
+        # polygons covered by a later one in the label image are reduced over their own mask below
+        overlapped = set(overlapped_zones(polygons, bbox, cloud.shape, labels))
+        labels_span.set(pixels=cloud.size, polygons=len(polygons), overlapped=len(overlapped))
+
+    zones = {}
+    for indicator in indicators:
+        with span("zonal.stats", indicator=indicator["id"]) as stats_span:
+            zones[indicator["name"]] = zonal_stats(
+                data[f"{indicator['id']}_index.tif"], labels, len(polygons), cloud=cloud
+            )
+            stats_span.set(pixels=cloud.size)
+
+    height, width = cloud.shape
+    results = []
+    for i, polygon_bounds in enumerate(PolygonArrays.from_coords(polygons).bounds().tolist()):
+        # Preview image cropped to the polygon's own bounding box
+        min_lon, min_lat, max_lon, max_lat = polygon_bounds
+        left = int((min_lon - bbox[0]) / (bbox[2] - bbox[0]) * width)
+        right = int(math.ceil((max_lon - bbox[0]) / (bbox[2] - bbox[0]) * width))
+        top = int((bbox[3] - max_lat) / (bbox[3] - bbox[1]) * height)
+        bottom = int(math.ceil((bbox[3] - min_lat) / (bbox[3] - bbox[1]) * height))
+
+        if i in overlapped:
+            mask = polygon_mask(polygons[i], bbox, cloud.shape)
+            stats = {
+                indicator["name"]: masked_stats(data[f"{indicator['id']}_index.tif"], mask, cloud)
+                for indicator in indicators
+            }
+        else:
+            stats = {name: zone_row(zone, i) for name, zone in zones.items()}
+        images = {
+            indicator["name"]: data[f"{indicator['id']}_default.png"][top:bottom, left:right]
+            for indicator in indicators
+        }
+        results.append((stats, images))
+    return results
+
+
+def fetch_sentinel_stats_many(polygons, max_workers=4, interval=None):
+    """
+    fetch_sentinel_stats for many polygons. Nearby polygons are grouped into shared tiles,
+    so every tile costs one request however many fields it contains.
+    :param polygons: List of polygon coordinates
+    :param max_workers: Number of tiles fetched at the same time
+    :param interval: (start_date, end_date) to fetch, the last ten days if not given
+    :return: List with a (stats, images) tuple per polygon, in input order
+    """
+    tiles = plan_tiles(PolygonArrays.from_coords(polygons).bounds())
+    results = [None] * len(polygons)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_tile_stats, tile.bbox, [polygons[i] for i in tile.members], interval): tile
+            for tile in tiles
+        }
+        for future in as_completed(futures):
+            for i, result in zip(futures[future].members, future.result()):
+                results[i] = result
+
+    return results
+
+
+def fetch_sentinel_data(polygon_coords, interval=None):
+
+    stats, images = fetch_sentinel_stats(polygon_coords, interval)
+    results = {name: indicator_stats["mean"] for name, indicator_stats in stats.items()}
 
     return results, images
 
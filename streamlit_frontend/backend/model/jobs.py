@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """
+    State of a background call. result is set once the job is DONE, error once it FAILED.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+
+class JobManager:
+    """
+    Runs calls on a background thread pool and tracks their state by key.
+    Submitting a key that is queued, running or done returns the existing job; failed jobs are retried.
+    Finished jobs are kept for other callers until max_finished newer ones have finished.
+    """
+
+    def __init__(self, max_workers=4, max_finished=1024):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.state != FAILED:
+                return job
+            job = Job(key)
+            self._jobs[key] = job
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.state = RUNNING
+        try:
+            job.result = fn(*args, **kwargs)
+            job.state = DONE
+        except Exception as e:
+            job.error = e
+            job.state = FAILED
+        job.finished_at = time.time()
+
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                self._jobs.move_to_end(job.key)
+            finished = [key for key, other in self._jobs.items() if other.finished]
+            for key in finished[: max(len(finished) - self.max_finished, 0)]:
+                del self._jobs[key]
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def forget(self, key):
+        with self._lock:
+            self._jobs.pop(key, None)
+
+
+jobs = JobManager()
@@ -1,15 +1,46 @@
-import joblib
+import math
+
 import pandas as pd
-import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from backend.model.irrigation import fetch_sentinel_data
+from backend.model.features import bin_indicators, encode_features
+from backend.model.irrigation import fetch_sentinel_data, fetch_tile_stats
+from backend.model.registry import CompiledModel, get_compiled_model, get_model
+from backend.model.geometry import PolygonArrays, validate_polygon
+from backend.model.tiles import Tile, plan_tiles
+from backend.model.tracing import span
 from backend.model.weather import check_for_rain, polygon_centroid
 
 
-def predict_on_polygon(polygon_coords):
+def predict_batch(values, model=None, compiled=True):
+    """
+    Predict whether to irrigate for many polygons at once from their raw indicator values.
+    The values are binned and encoded with NumPy and scored in a single call.
+    :param values: Array-like of shape (n, 4) with NDVI Index, EVI Index, Moisture Stress and rain presence per row
+    :param model: Fitted or compiled irrigation model, the shared model from the registry if not given
+    :param compiled: Score the shared model through its precomputed lookup table instead of sklearn
+    :return: Array with the n irrigation predictions
+    """
+    if model is None:
+        model = get_compiled_model() if compiled else get_model()
+    compiled = isinstance(model, CompiledModel)
+
+    with span("model.predict", model="compiled" if compiled else "sklearn") as predict_span:
+        binned = bin_indicators(values)
+        predict_span.set(rows=len(binned[0]))
+        if compiled:
+            return model.predict(binned)
+
+        features = encode_features(binned, model.feature_names_in_)
+        # Keep the column names so the model sees the same input format as during training
+        return model.predict(pd.DataFrame(features, columns=model.feature_names_in_))
+
+
+def predict_on_polygon(polygon_coords, interval=None):
     """
     Predict whether to irrigate based on the Sentinel-2 and weather data.
     :param polygon_coords: List of coordinates of the polygon
+    :param interval: (start_date, end_date) of the Sentinel-2 data, the last ten days if not given
     :return:
     Prediction - Whether to irrigate or not
     EVI Index - healthy if > 0.2,
@@ -17,50 +48,116 @@ def predict_on_polygon(polygon_coords):
     Current Temperature - Temperature at the centroid of the polygon
     Current Humidity - Humidity at the centroid of the polygon
     """
-    # Load the model
-    cwd = os.getcwd()
-    model = joblib.load(f"{cwd}/backend/model/irrigation_model.joblib")
-
     # fetch the data
-    results, images = fetch_sentinel_data(polygon_coords)
-    print(images)
-    lon, lat = polygon_centroid(polygon_coords)
+    results, images = fetch_sentinel_data(polygon_coords, interval)
+    return _predict_from_results(polygon_coords, results)
+
+
+def _predict_from_results(polygon_coords, results, centroid=None):
+    lon, lat = centroid or polygon_centroid(polygon_coords)
     rain_presence, current_temp, current_humidity = check_for_rain(lat, lon)
 
-    # Evaluating
-    if results["Moisture Stress"] > 0.4:
-        moisture_index_value = "High"
-    elif results["Moisture Stress"] <= 0.4 and results["Moisture Stress"] > 0.2:
-        moisture_index_value = "Moderate"
-    elif results["Moisture Stress"] <= 0.2 and results["Moisture Stress"] > 0:
-        moisture_index_value = "Low"
-    else:
-        moisture_index_value = "Dry"
-
-    # Prepare the input data for inference
-    data = {
-        "is_vegetation": [True if results["NDVI Index"] > 0.2 else False],
-        "vegetation_health": [
-            "Healthy" if results["EVI Index"] > 0.2 else "Not Healthy"
-        ],
-        "moisture_index": [moisture_index_value],
-        "rain_presence": [rain_presence],
+    # Predict
+    values = [results["NDVI Index"], results["EVI Index"], results["Moisture Stress"], rain_presence]
+    prediction = predict_batch(values)
+    return prediction[0], results["EVI Index"], results["Moisture Stress"], current_temp, current_humidity
+
+
+def _number(value):
+    # JSON has no NaN, cloud-covered fields get None instead
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def prediction_record(result):
+    """
+    JSON-serializable dict of a predict_on_polygon result.
+    """
+    should_irrigate, evi_index, moisture_stress, current_temp, current_humidity = result
+    return {
+        "irrigate": bool(should_irrigate),
+        "evi": _number(evi_index),
+        "moisture_stress": _number(moisture_stress),
+        "temperature": _number(current_temp),
+        "humidity": _number(current_humidity),
     }
 
-    # Convert input data to DataFrame and encode categorical features
-    input_df = pd.DataFrame(data)
-    input_df = pd.get_dummies(
-        input_df, columns=["vegetation_health", "moisture_index"], drop_first=True
-    )
 
-    # Ensure input DataFrame has the same columns as training data
-    for col in model.feature_names_in_:
-        if col not in input_df.columns:
-            input_df[col] = 0
+def predict_on_polygons(polygons, max_workers=8, interval=None, executor=None):
+    """
+    Run the predict_on_polygon pipeline for many polygons concurrently and yield the results as each polygon completes.
+    Nearby polygons are grouped into tiles that share a single Sentinel request (see backend.model.tiles), and
+    requests to every upstream host are additionally bounded by the limits in backend.model.concurrency.
+    :param polygons: Either a list of polygon coordinate lists or a dict mapping a key to polygon coordinates
+    :param max_workers: Number of tiles and polygons processed at the same time
+    :param interval: (start_date, end_date) of the Sentinel-2 data, the last ten days if not given
+    :param executor: Thread pool to run the tiles and polygons on instead of a new one of max_workers threads,
+    e.g. one shared by all batches of a service. It must not be the pool the caller itself runs on.
+    :return:
+    Generator of (key, result, error) tuples in completion order. The key is the list index or dict key,
+    result is the predict_on_polygon tuple or None if the prediction raised, in which case error holds the exception.
+    Invalid polygons (see backend.model.geometry.validate_polygon) are yielded first with their ValueError.
+    """
+    if isinstance(polygons, dict):
+        items = list(polygons.items())
+    else:
+        items = list(enumerate(polygons))
+
+    keys, coords = [], []
+    for key, polygon_coords in items:
+        # a malformed polygon fails on its own instead of the whole batch
+        try:
+            validate_polygon(polygon_coords)
+        except (TypeError, ValueError, IndexError) as e:
+            yield key, None, e if isinstance(e, ValueError) else ValueError(f"Invalid polygon coordinates: {e}")
+            continue
+        keys.append(key)
+        coords.append(polygon_coords)
+    if not coords:
+        return
+
+    # bounding boxes and centroids of all polygons in one pass
+    with span("geometry.prepare") as prepare_span:
+        geometry = PolygonArrays.from_coords(coords)
+        centroids = geometry.centroids().tolist()
+        tiles = plan_tiles(geometry.bounds())
+        prepare_span.set(polygons=len(coords), tiles=len(tiles))
 
-    # Predict
-    prediction = model.predict(input_df)
-    return prediction[0], results["EVI Index"], results["Moisture Stress"], current_temp, current_humidity
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="predict")
+    # Futures map to the Tile they fetch or to the index of the polygon they score
+    pending = {}
+    try:
+        for tile in tiles:
+            pending[executor.submit(fetch_tile_stats, tile.bbox, [coords[i] for i in tile.members], interval)] = tile
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                error = future.exception()
+
+                if isinstance(job, Tile):
+                    if error is not None:
+                        for i in job.members:
+                            yield keys[i], None, error
+                        continue
+                    for i, (stats, _) in zip(job.members, future.result()):
+                        results = {name: indicator_stats["mean"] for name, indicator_stats in stats.items()}
+                        pending[executor.submit(_predict_from_results, coords[i], results, centroids[i])] = i
+                elif error is not None:
+                    yield keys[job], None, error
+                else:
+                    yield keys[job], future.result(), None
+    finally:
+        # stop queued work if the caller stops consuming early
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            for future in pending:
+                future.cancel()
 
 
 if __name__ == "__main__":
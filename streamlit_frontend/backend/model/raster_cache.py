@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to atomic renames without cross-process locking
+    fcntl = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cache settings, overridable through the environment (.env)
+CACHE_DIR = os.getenv("SENTINEL_CACHE_DIR", os.path.join(BACKEND_DIR, "output", "sentinel_cache"))
+CACHE_MAX_BYTES = int(os.getenv("SENTINEL_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Sentinel-2 revisits every few days, so a raster stays valid for a while
+CACHE_MAX_AGE = float(os.getenv("SENTINEL_CACHE_MAX_AGE", 12 * 60 * 60))
+
+# Lock files shared by the keys hashing to them; they are never deleted, other processes may hold them
+LOCK_STRIPES = 256
+
+# Name under which a single-array response is stored
+_ARRAY_KEY = "__array__"
+_CREATED_KEY = "__created__"
+
+
+def cache_key(*parts):
+    """
+    Content address of a request: sha256 of its JSON-serialized parameters.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _file_lock(path):
+    with open(path, "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class RasterCache:
+    """
+    On-disk cache for downloaded Sentinel Hub responses, shared by all processes using the same directory.
+
+    Entries are compressed .npz files named after the request's content address. Reading an entry refreshes
+    its modification time, and the least recently used entries are evicted once the directory exceeds
+    max_bytes. Entries older than max_age seconds are downloaded again.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _lock_path(self, key):
+        stripe = int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:8], 16) % LOCK_STRIPES
+        return os.path.join(self.directory, f".fetch-{stripe:03d}.lock")
+
+    def get(self, key):
+        """
+        Return the cached response for key, or None if it is missing or stale.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as stored:
+                if time.time() - float(stored[_CREATED_KEY]) > self.max_age:
+                    return None
+                data = {name: stored[name] for name in stored.files if name != _CREATED_KEY}
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if _ARRAY_KEY in data:
+            return data[_ARRAY_KEY]
+        return data
+
+    def put(self, key, data):
+        """
+        Store a response, either a single array or a dict of arrays, and evict old entries if needed.
+        """
+        arrays = {_ARRAY_KEY: data} if isinstance(data, np.ndarray) else dict(data)
+        arrays[_CREATED_KEY] = np.array(time.time())
+
+        os.makedirs(self.directory, exist_ok=True)
+        # write to a temporary file first so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                np.savez_compressed(tmp_file, **arrays)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Return the cached response for key, calling fetch() and storing its result on a miss.
+        Concurrent misses for the same key, also from other processes, wait for a single fetch.
+        """
+        if not self.enabled:
+            return fetch()
+
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        os.makedirs(self.directory, exist_ok=True)
+        with _file_lock(self._lock_path(key)):
+            # another worker may have filled the entry while we waited for the lock
+            data = self.get(key)
+            if data is None:
+                data = fetch()
+                self.put(key, data)
+        return data
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits into max_bytes.
+        """
+        with _file_lock(os.path.join(self.directory, ".evict.lock")):
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(".npz"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+cache = RasterCache()
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+
+import joblib
+import pandas as pd
+
+from backend.model.features import all_combinations, combination_codes, encode_features
+from backend.model.tracing import span
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "irrigation_model.joblib")
+
+# Columns produced by model.py (pd.get_dummies with drop_first=True) and understood by encode_features
+EXPECTED_FEATURES = [
+    "is_vegetation",
+    "rain_presence",
+    "vegetation_health_Not Healthy",
+    "moisture_index_High",
+    "moisture_index_Low",
+    "moisture_index_Moderate",
+]
+
+
+def schema_fingerprint(feature_names):
+    """
+    Short hash identifying an ordered list of feature columns.
+    """
+    return hashlib.sha256("\n".join(feature_names).encode("utf-8")).hexdigest()[:16]
+
+
+EXPECTED_FINGERPRINT = schema_fingerprint(EXPECTED_FEATURES)
+
+
+class CompiledModel:
+    """
+    Lookup table with the model output for every categorical input combination.
+    Scoring is a single array read per row, without sklearn's input validation.
+    """
+
+    def __init__(self, model):
+        self.classes_ = model.classes_
+        self.feature_names_in_ = model.feature_names_in_
+        self.fingerprint = schema_fingerprint(list(model.feature_names_in_))
+
+        features = encode_features(all_combinations(), model.feature_names_in_)
+        self.table = model.predict(pd.DataFrame(features, columns=model.feature_names_in_))
+
+    def predict(self, binned):
+        """
+        :param binned: Tuple returned by backend.model.features.bin_indicators
+        :return: Array with one prediction per row
+        """
+        return self.table[combination_codes(binned)]
+
+
+_models = {}
+_compiled_models = {}
+_lock = threading.Lock()
+
+
+def _load(path):
+    model = joblib.load(path)
+    fingerprint = schema_fingerprint(list(model.feature_names_in_))
+    if fingerprint != EXPECTED_FINGERPRINT:
+        raise ValueError(
+            f"Model at {path} has feature schema {fingerprint}, expected {EXPECTED_FINGERPRINT}. "
+            f"Columns: {list(model.feature_names_in_)}"
+        )
+    return model
+
+
+def get_model(path=MODEL_PATH):
+    """
+    Return the irrigation model stored at path. The artifact is loaded and checked once per process.
+    """
+    with _lock:
+        model = _models.get(path)
+        if model is None:
+            with span("model.load") as load_span:
+                model = _load(path)
+                load_span.set(bytes=os.path.getsize(path))
+            _models[path] = model
+        return model
+
+
+def get_compiled_model(path=MODEL_PATH):
+    """
+    Return the lookup-table version of the irrigation model stored at path, compiled once per process.
+    """
+    model = get_model(path)
+    with _lock:
+        compiled = _compiled_models.get(path)
+        if compiled is None:
+            with span("model.compile") as compile_span:
+                compiled = CompiledModel(model)
+                compile_span.set(rows=len(compiled.table))
+            _compiled_models[path] = compiled
+        return compiled
+
+
+def clear():
+    """
+    Forget all loaded models, e.g. after retraining with model.py.
+    """
+    with _lock:
+        _models.clear()
+        _compiled_models.clear()
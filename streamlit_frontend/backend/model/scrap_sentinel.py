@@ -1,15 +1,26 @@
+import math
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from dotenv import load_dotenv
 from sentinelhub import (
     SHConfig,
     BBox,
     CRS,
     DataCollection,
+    SentinelHubCatalog,
     SentinelHubRequest,
     MimeType,
     bbox_to_dimensions,
 )
 
+from backend.model.concurrency import SENTINEL_HOST, host_slot
+from backend.model.geometry import polygon_bbox
+from backend.model.raster_cache import cache as raster_cache, cache_key
+from backend.model.tiles import bbox_size_m
+from backend.model.tracing import span
+
 load_dotenv()
 
 # Configure API credentials
@@ -18,6 +29,21 @@ config.instance_id = os.getenv("INSTANCE_ID")
 config.sh_client_id = os.getenv("CLIENT_ID")
 config.sh_client_secret = os.getenv("CLIENT_SECRET")
 
+# Finest useful resolution in meters: the 10 m bands of Sentinel-2
+NATIVE_RESOLUTION = 10
+# Coarsest resolution used before large areas are split into sub-tiles instead
+MAX_RESOLUTION = 60
+# Target number of pixels per request
+PIXEL_BUDGET = int(os.getenv("SENTINEL_PIXEL_BUDGET", 1_000_000))
+# Sentinel Hub rejects outputs larger than this many pixels per side
+MAX_DIMENSION = 2500
+
+# Collection all requests go to; its service URL decides the Sentinel Hub deployment that is called
+DATA_COLLECTION = DataCollection.SENTINEL2_L2A
+
+# Output responses requested when the caller does not ask for specific ones
+DEFAULT_RESPONSES = [("default", MimeType.PNG), ("index", MimeType.TIFF)]
+
 polygon_coords = [
     [16.249166, 52.656369],
     [16.242085, 52.650071],
@@ -29,41 +55,70 @@ polygon_coords = [
 
 
 # Define a function to convert a polygon to a bounding box
-# To do: account for multipolygons
 def polygon_to_bbox(polygon_coords):
-    # Extract all longitudes and latitudes from the polygon points
-    longitudes = [point[0] for point in polygon_coords]
-    latitudes = [point[1] for point in polygon_coords]
-
-    # Get the min and max for both longitude and latitude
-    min_lon = min(longitudes)
-    max_lon = max(longitudes)
-    min_lat = min(latitudes)
-    max_lat = max(latitudes)
-
-    # Return the bounding box in the format [min_lon, min_lat, max_lon, max_lat]
-    return [min_lon, min_lat, max_lon, max_lat]
+    """
+    Bounding box of a ring, a polygon with holes or a multipolygon, given as GeoJSON-style coordinates.
+    """
+    return polygon_bbox(polygon_coords)
 
 
-def calculate_dynamic_resolution(bbox):
-    min_lon, min_lat, max_lon, max_lat = bbox
-    lon_diff = max_lon - min_lon
-    lat_diff = max_lat - min_lat
+def calculate_dynamic_resolution(bbox, pixel_budget=PIXEL_BUDGET):
+    """
+    Resolution in meters per pixel for a bounding box [min_lon, min_lat, max_lon, max_lat].
+    Small areas are requested at the native band resolution, larger ones at the resolution that keeps
+    the raster within pixel_budget pixels, but never coarser than MAX_RESOLUTION.
+    """
+    width_m, height_m = bbox_size_m(bbox)
+    resolution = math.sqrt(width_m * height_m / pixel_budget)
+    return min(max(resolution, NATIVE_RESOLUTION), MAX_RESOLUTION)
 
-    # Set base resolution factor based on typical values for Sentinel-2
-    # Increase the resolution (decrease resolution value) for smaller areas
-    area = lon_diff * lat_diff  # Approximate area in degrees²
-    if area > 0.05:
-        resolution = 20  # Low resolution for large areas
-    elif area > 0.01:
-        resolution = 10  # Medium resolution
-    else:
-        resolution = 5  # High resolution for small areas
 
-    return resolution
+def split_bbox(bbox_coords, size, max_dimension=MAX_DIMENSION):
+    """
+    Split a raster request into sub-tiles no larger than max_dimension pixels per side.
+    The sub-tiles partition the raster's pixel grid exactly, so they can be mosaicked back together.
+    :param bbox_coords: Raster extent as [min_lon, min_lat, max_lon, max_lat]
+    :param size: Raster (width, height) in pixels
+    :return: Row-major (north to south) list of rows, each a west to east list of (bbox_coords, size) pairs
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox_coords
+    width, height = size
+    n_cols = math.ceil(width / max_dimension)
+    n_rows = math.ceil(height / max_dimension)
+    col_edges = [round(i * width / n_cols) for i in range(n_cols + 1)]
+    row_edges = [round(i * height / n_rows) for i in range(n_rows + 1)]
+    lon_step = (max_lon - min_lon) / width
+    lat_step = (max_lat - min_lat) / height
+
+    rows = []
+    for top, bottom in zip(row_edges, row_edges[1:]):
+        row = []
+        for left, right in zip(col_edges, col_edges[1:]):
+            tile_bbox = [
+                min_lon + left * lon_step,
+                max_lat - bottom * lat_step,
+                min_lon + right * lon_step,
+                max_lat - top * lat_step,
+            ]
+            row.append((tile_bbox, (right - left, bottom - top)))
+        rows.append(row)
+    return rows
+
+
+def mosaic(rows):
+    """
+    Stitch the responses of a split_bbox grid back into a single response.
+    """
+    first = rows[0][0]
+    if isinstance(first, np.ndarray):
+        return np.concatenate([np.concatenate(row, axis=1) for row in rows], axis=0)
+    return {
+        name: np.concatenate([np.concatenate([tile[name] for tile in row], axis=1) for row in rows], axis=0)
+        for name in first
+    }
 
 
-def get_data(polygon_coords, time_interval, evalscript):
+def get_data(polygon_coords, time_interval, evalscript, responses=None):
     """
     Download Sentinel-2 data for a given area of interest, time interval, and EvalScript.
 
@@ -72,37 +127,90 @@ def get_data(polygon_coords, time_interval, evalscript):
     - time_interval (tuple): Date range as a tuple (start_date, end_date) in "YYYY-MM-DD" format.
     - config: SentinelHub configuration instance.
     - evalscript (str): Custom EvalScript for processing Sentinel-2 data.
+    - responses (list): Optional (identifier, MimeType) pairs matching the EvalScript outputs.
+      Defaults to a "default" PNG and an "index" TIFF.
 
     Returns:
-    - image (array): Downloaded image data.
+    - image (dict): Downloaded image data keyed by "<identifier>.<extension>".
+    """
+    return get_data_for_bbox(polygon_to_bbox(polygon_coords), time_interval, evalscript, responses)
+
+
+def get_data_for_bbox(bbox_coords, time_interval, evalscript, responses=None):
     """
+    Download Sentinel-2 data for a bounding box [min_lon, min_lat, max_lon, max_lat], see get_data.
+    """
+    if responses is None:
+        responses = DEFAULT_RESPONSES
+
     # Define bounding box and size
-    bbox_coords = polygon_to_bbox(polygon_coords)
     bbox = BBox(bbox=bbox_coords, crs=CRS.WGS84)
     resolution = calculate_dynamic_resolution(bbox_coords)
     size = bbox_to_dimensions(bbox, resolution=resolution)
 
+    # Areas above the output size limit are fetched as sub-tiles in parallel and mosaicked
+    grid = split_bbox(bbox_coords, size)
+    if len(grid) == 1 and len(grid[0]) == 1:
+        return _request_tile(bbox_coords, size, time_interval, evalscript, responses)
+
+    with ThreadPoolExecutor(max_workers=4, thread_name_prefix="sentinel-tile") as executor:
+        futures = [
+            [executor.submit(_request_tile, tile_bbox, tile_size, time_interval, evalscript, responses)
+             for tile_bbox, tile_size in row]
+            for row in grid
+        ]
+        return mosaic([[future.result() for future in row] for row in futures])
+
+
+def get_acquisition_dates(polygon_coords, time_interval):
+    """
+    Dates ("YYYY-MM-DD") with a Sentinel-2 L2A acquisition over the polygon, from the Sentinel Hub catalog.
+    """
+    catalog = SentinelHubCatalog(config=config)
+    bbox = BBox(bbox=polygon_to_bbox(polygon_coords), crs=CRS.WGS84)
+    with host_slot(SENTINEL_HOST):
+        dates = list(catalog.search(DATA_COLLECTION, bbox=bbox, time=time_interval, distinct="date"))
+    return sorted(set(dates))
+
+
+def _request_tile(bbox_coords, size, time_interval, evalscript, responses):
     # Define the request for Sentinel-2 data
     request = SentinelHubRequest(
-        data_folder="output",
         evalscript=evalscript,  # Use the passed EvalScript
         input_data=[
             SentinelHubRequest.input_data(
-                data_collection=DataCollection.SENTINEL2_L2A,
+                data_collection=DATA_COLLECTION,
                 time_interval=time_interval,
             )
         ],
         responses=[
-            SentinelHubRequest.output_response("default", MimeType.PNG),
-            SentinelHubRequest.output_response("index", MimeType.TIFF),
+            SentinelHubRequest.output_response(identifier, mime_type)
+            for identifier, mime_type in responses
         ],
-        bbox=bbox,
+        bbox=BBox(bbox=bbox_coords, crs=CRS.WGS84),
         size=size,
         config=config,
     )
 
-    # Download and save the data
-    image = request.get_data()[0]
+    with span("sentinel.request") as request_span:
+        request_span.set(pixels=size[0] * size[1], cache="hit")
+
+        def download():
+            with host_slot(SENTINEL_HOST):
+                # undecoded, so the transferred bytes can be counted
+                response = request.get_data(decode_data=False)[0]
+            request_span.set(bytes=len(response.content), cache="miss")
+            return response.decode()
+
+        # Identical requests are served from the on-disk cache
+        key = cache_key(
+            bbox_coords,
+            time_interval,
+            evalscript,
+            size,
+            [(identifier, mime_type.extension) for identifier, mime_type in responses],
+        )
+        image = raster_cache.get_or_fetch(key, download)
 
     return image
 
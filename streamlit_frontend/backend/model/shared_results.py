@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from backend.model.weather_cache import CURRENT_TTL
+
+# Results kept in memory, shared by all sessions of the process
+MAX_ENTRIES = int(os.getenv("SHARED_RESULTS_MAX_ENTRIES", 1024))
+# Seconds a result is shared; predictions include the current weather, so never longer than its cache keeps it
+TTL = min(float(os.getenv("SHARED_RESULTS_TTL", CURRENT_TTL)), CURRENT_TTL)
+
+
+class SharedResults:
+    """
+    Process-wide store of computed results with least recently used eviction.
+
+    Every key has its own lock while it is computed: a caller asking for a key that another thread is computing
+    waits for that computation and gets its result instead of starting a second one, while other keys proceed
+    in parallel. Failed computations are not stored, the next caller computes the key again.
+    Results older than ttl seconds count as missing.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> [lock, number of threads using it], removed once nobody uses the lock
+        self._key_locks = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key, default=None):
+        """
+        The stored result for key, without computing it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, stored_at = entry
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._key_locks
+
+    def _acquire(self, key):
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        return entry
+
+    def _release(self, key, entry):
+        entry[0].release()
+        with self._lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._key_locks[key]
+
+    def get_or_compute(self, key, fn, *args, **kwargs):
+        """
+        The stored result for key, computing and storing fn(*args, **kwargs) if there is none.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        entry = self._acquire(key)
+        try:
+            # computed by the thread that held the lock before us
+            value = self.get(key, missing)
+            if value is missing:
+                value = fn(*args, **kwargs)
+                self.put(key, value)
+            return value
+        finally:
+            self._release(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+results = SharedResults()
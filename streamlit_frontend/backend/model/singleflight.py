@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time. Callers arriving while a call for their key is in flight
+    wait for it and receive the same result or exception instead of starting their own call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight for use on one event loop. The call for a key runs as its own task,
+    so a caller that is cancelled (e.g. a disconnected client) does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    def in_flight(self, key):
+        return key in self._calls
+
+    def _register(self, key, future):
+        self._calls[key] = future
+        future.add_done_callback(lambda done: self._finished(key, done))
+
+    def _finished(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # mark the exception as retrieved even if every caller went away
+            future.exception()
+
+    async def do(self, key, fn, *args):
+        """
+        Await the coroutine function fn(*args), or the call already in flight for key.
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn(*args))
+            self._register(key, future)
+        return await asyncio.shield(future)
+
+    def claim(self, keys):
+        """
+        Futures for many keys at once, for callers that compute several keys in a single call.
+        :return:
+        Tuple (futures, claimed). futures maps every key to the future of its result, claimed lists the keys
+        that were not in flight. The caller must complete the futures of the claimed keys.
+        """
+        loop = asyncio.get_running_loop()
+        futures = {}
+        claimed = []
+        for key in keys:
+            if key in futures:
+                continue
+            future = self._calls.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._register(key, future)
+                claimed.append(key)
+            futures[key] = future
+        return futures, claimed
@@ -0,0 +1,59 @@
+import threading
+
+import shapely
+from shapely.geometry import Point, shape
+
+# Number of geometries added since the last build before the tree is rebuilt
+REBUILD_THRESHOLD = 32
+
+
+class PolygonIndex:
+    """
+    Point-in-polygon index over prepared shapely geometries.
+    Geometries live in an STRtree; new ones are kept in a small buffer that is searched linearly,
+    and the tree is rebuilt once the buffer reaches REBUILD_THRESHOLD entries.
+    """
+
+    def __init__(self, rebuild_threshold=REBUILD_THRESHOLD):
+        self.rebuild_threshold = rebuild_threshold
+        self._keys = []
+        self._key_set = set()
+        self._geometries = []
+        self._tree = None
+        self._tree_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def add(self, key, geometry):
+        """
+        :param key: Identifier returned by queries
+        :param geometry: shapely geometry or GeoJSON geometry dict
+        """
+        if isinstance(geometry, dict):
+            geometry = shape(geometry)
+        shapely.prepare(geometry)
+        with self._lock:
+            self._keys.append(key)
+            self._key_set.add(key)
+            self._geometries.append(geometry)
+            if len(self._geometries) - self._tree_size >= self.rebuild_threshold:
+                self._tree = shapely.STRtree(self._geometries)
+                self._tree_size = len(self._geometries)
+
+    def query_point(self, lon, lat):
+        """
+        Keys of all geometries containing the point, in insertion order.
+        """
+        point = Point(lon, lat)
+        with self._lock:
+            candidates = []
+            if self._tree is not None:
+                # bounding box candidates only; a predicate here would be evaluated on the point, not the prepared polygons
+                candidates = sorted(self._tree.query(point).tolist())
+            candidates += range(self._tree_size, len(self._geometries))
+            return [self._keys[i] for i in candidates if self._geometries[i].contains(point)]
@@ -0,0 +1,67 @@
+import numpy as np
+
+# Meters per degree of latitude, and of longitude at the equator
+METERS_PER_DEG_LAT = 110574.0
+METERS_PER_DEG_LON = 111320.0
+
+# Largest tile side; 5 km at Sentinel-2's 10 m resolution is a 500 px raster
+MAX_TILE_SIZE_M = 5000.0
+
+
+def bbox_size_m(bbox):
+    """
+    Approximate (width, height) of a [min_lon, min_lat, max_lon, max_lat] box in meters.
+    Also accepts the four bounds as arrays to size many boxes at once.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    mid_lat = np.radians((min_lat + max_lat) / 2)
+    width = (max_lon - min_lon) * METERS_PER_DEG_LON * np.cos(mid_lat)
+    height = (max_lat - min_lat) * METERS_PER_DEG_LAT
+    return width, height
+
+
+def union_bbox(a, b):
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+class Tile:
+    """
+    Area fetched with a single request, shared by the polygons listed in members (indices into the input).
+    """
+
+    def __init__(self, bbox, members):
+        self.bbox = bbox
+        self.members = members
+
+    def __repr__(self):
+        return f"Tile(bbox={self.bbox}, members={self.members})"
+
+
+def plan_tiles(bboxes, max_tile_size_m=MAX_TILE_SIZE_M):
+    """
+    Group polygons into tiles so that nearby polygons are fetched together.
+    Polygons are visited west to east and added to the first tile whose union with the polygon still fits
+    into max_tile_size_m in both directions; otherwise they start a new tile. A polygon larger than the
+    limit gets a tile of its own.
+    :param bboxes: Bounding box of every polygon as [min_lon, min_lat, max_lon, max_lat]
+    :param max_tile_size_m: Largest allowed tile width and height in meters
+    :return: List of Tile
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    # bounds of the tiles planned so far, grown in place as polygons join them
+    extents = np.empty_like(bboxes)
+    members = []
+    for i in np.argsort(bboxes[:, 0], kind="stable").tolist():
+        bbox = bboxes[i]
+        n = len(members)
+        # every tile's union with the polygon, sized in one pass
+        merged = np.hstack([np.minimum(extents[:n, :2], bbox[:2]), np.maximum(extents[:n, 2:], bbox[2:])])
+        width, height = bbox_size_m(merged.T)
+        fits = np.flatnonzero((width <= max_tile_size_m) & (height <= max_tile_size_m))
+        if len(fits):
+            extents[fits[0]] = merged[fits[0]]
+            members[fits[0]].append(i)
+        else:
+            extents[n] = bbox
+            members.append([i])
+    return [Tile(extents[j].tolist(), tile_members) for j, tile_members in enumerate(members)]
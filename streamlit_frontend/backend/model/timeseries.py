@@ -0,0 +1,266 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pandas as pd
+
+from backend.model.downsample import lttb
+from backend.model.irrigation import fetch_sentinel_stats
+from backend.model.scrap_sentinel import get_acquisition_dates
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.getenv("TIMESERIES_DB", os.path.join(BACKEND_DIR, "output", "timeseries.sqlite"))
+
+# Statistics of backend.model.zonal kept per acquisition
+STAT_COLUMNS = ["mean", "median", "p10", "p90", "valid_fraction", "cloud_fraction"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS indicator_stats (
+    field_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    indicator TEXT NOT NULL,
+    {", ".join(f"{column} REAL" for column in STAT_COLUMNS)},
+    PRIMARY KEY (field_id, date, indicator)
+);
+CREATE TABLE IF NOT EXISTS weather (
+    field_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    temperature REAL,
+    humidity REAL,
+    PRIMARY KEY (field_id, date)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    field_id TEXT NOT NULL,
+    series TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    min REAL,
+    max REAL,
+    sum REAL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (field_id, series, period, bucket)
+);
+"""
+
+# Weather columns that get rollups next to the indicator means
+WEATHER_SERIES = ["temperature", "humidity"]
+ROLLUP_PERIODS = ["day", "week", "month"]
+
+
+def bucket_range(day, period):
+    """
+    First and last date of the rollup bucket of the given period containing day.
+    """
+    if period == "day":
+        return day, day
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+
+def _period_for_span(days, max_points):
+    # finest period whose number of buckets fits into the point budget
+    for period, length in (("day", 1), ("week", 7), ("month", 30)):
+        if days / length <= max_points:
+            return period
+    return "month"
+
+
+class TimeSeriesStore:
+    """
+    SQLite store with per-acquisition indicator statistics and weather readings for every monitored field.
+    Fields are identified by backend.model.geometry.geometry_key.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def connect(self):
+        with self._init_lock:
+            if not self._initialized:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                connection = sqlite3.connect(self.path, timeout=30)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                connection.close()
+                self._initialized = True
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def stored_dates(self, field_id, start, end):
+        """
+        Acquisition dates between start and end (inclusive, "YYYY-MM-DD") already stored for the field.
+        """
+        with self.connect() as connection:
+            rows = connection.execute(
+                "SELECT DISTINCT date FROM indicator_stats WHERE field_id = ? AND date BETWEEN ? AND ?",
+                (field_id, start, end),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def add_indicator_stats(self, field_id, acquisition_date, stats):
+        """
+        Store the statistics of one acquisition.
+        :param stats: Dict mapping indicator name to its zonal statistics
+        """
+        rows = [
+            (field_id, acquisition_date, name, *(indicator_stats.get(column) for column in STAT_COLUMNS))
+            for name, indicator_stats in stats.items()
+        ]
+        with self.connect() as connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO indicator_stats VALUES ({', '.join('?' * (3 + len(STAT_COLUMNS)))})",
+                rows,
+            )
+            for name in stats:
+                self._update_rollups(connection, field_id, name, acquisition_date)
+
+    def add_weather(self, field_id, reading_date, temperature, humidity):
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?)",
+                (field_id, reading_date, temperature, humidity),
+            )
+            for series in WEATHER_SERIES:
+                self._update_rollups(connection, field_id, series, reading_date)
+
+    @staticmethod
+    def _update_rollups(connection, field_id, series, day):
+        # Recompute the day, week and month buckets containing day from the stored values. A bucket holds
+        # at most a month of rows, and recomputing keeps min/max right when a value is replaced.
+        if series in WEATHER_SERIES:
+            query = f"SELECT MIN({series}), MAX({series}), SUM({series}), COUNT({series}) FROM weather " \
+                    "WHERE field_id = ? AND date BETWEEN ? AND ?"
+            params = (field_id,)
+        else:
+            query = "SELECT MIN(mean), MAX(mean), SUM(mean), COUNT(mean) FROM indicator_stats " \
+                    "WHERE field_id = ? AND indicator = ? AND date BETWEEN ? AND ?"
+            params = (field_id, series)
+
+        day = date.fromisoformat(day)
+        for period in ROLLUP_PERIODS:
+            start, end = bucket_range(day, period)
+            aggregate = connection.execute(query, params + (start.isoformat(), end.isoformat())).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (field_id, series, period, start.isoformat(), *aggregate),
+            )
+
+    def rollup(self, field_id, series, period, start=None):
+        """
+        Rollup buckets of one series as a DataFrame indexed by bucket start, with min, mean, max and count.
+        :param period: "day", "week" or "month"
+        :param start: First date ("YYYY-MM-DD") to include, all history if not given
+        """
+        first_bucket = bucket_range(date.fromisoformat(start), period)[0].isoformat() if start else ""
+        with self.connect() as connection:
+            rollups = pd.read_sql_query(
+                "SELECT bucket, min, sum / count AS mean, max, count FROM rollups "
+                "WHERE field_id = ? AND series = ? AND period = ? AND bucket >= ? AND count > 0 ORDER BY bucket",
+                connection,
+                params=(field_id, series, period, first_bucket),
+            )
+        rollups.index = pd.to_datetime(rollups.pop("bucket"))
+        rollups.index.name = "Date"
+        return rollups
+
+    def first_date(self, field_id):
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT MIN(bucket) FROM rollups WHERE field_id = ? AND period = 'day' AND count > 0", (field_id,)
+            ).fetchone()
+        return row[0]
+
+    def chart(self, field_id, series, days=None, max_points=500):
+        """
+        Means of several series for a chart, with at most max_points points in total.
+        The rollup period is chosen from the length of the history, and LTTB downsampling
+        is applied if even the coarsest period has too many buckets.
+        :param series: Indicator names and/or WEATHER_SERIES columns
+        :param days: Length of the history to show, all of it if not given
+        :return: DataFrame indexed by date with one column per series
+        """
+        if days is None:
+            first = self.first_date(field_id)
+            if first is None:
+                return pd.DataFrame(columns=series)
+            start = first
+            days = (date.today() - date.fromisoformat(first)).days + 1
+        else:
+            start = (date.today() - timedelta(days=days)).isoformat()
+
+        points_per_series = max(max_points // len(series), 3)
+        period = _period_for_span(days, points_per_series)
+
+        columns = {}
+        for name in series:
+            means = self.rollup(field_id, name, period, start)["mean"]
+            if len(means) > points_per_series:
+                means = means.iloc[lttb(means.index.asi8, means.to_numpy(), points_per_series)]
+            columns[name] = means
+        return pd.DataFrame(columns, columns=series)
+
+    def load(self, field_id, days):
+        """
+        History of the last days as a DataFrame indexed by date, with the mean of every indicator
+        and the temperature and humidity readings as columns. Dates without data are missing.
+        """
+        start = (date.today() - timedelta(days=days)).isoformat()
+        with self.connect() as connection:
+            indicators = pd.read_sql_query(
+                "SELECT date, indicator, mean FROM indicator_stats WHERE field_id = ? AND date >= ?",
+                connection,
+                params=(field_id, start),
+            )
+            weather = pd.read_sql_query(
+                "SELECT date, temperature, humidity FROM weather WHERE field_id = ? AND date >= ?",
+                connection,
+                params=(field_id, start),
+            )
+
+        history = indicators.pivot(index="date", columns="indicator", values="mean")
+        history = history.join(weather.set_index("date"), how="outer")
+        history.index = pd.to_datetime(history.index)
+        history.index.name = "Date"
+        return history.sort_index()
+
+
+store = TimeSeriesStore()
+
+
+def update_field(field_id, polygon_coords, days=30, store=store):
+    """
+    Fetch the statistics of every acquisition of the last days that is not stored yet.
+    :return: List of the newly stored dates
+    """
+    end = date.today()
+    start = end - timedelta(days=days)
+    interval = (start.isoformat(), end.isoformat())
+
+    acquisitions = get_acquisition_dates(polygon_coords, interval)
+    missing = sorted(set(acquisitions) - store.stored_dates(field_id, *interval))
+    for acquisition_date in missing:
+        # Dates without valid pixels are stored too (as NaN), so they are not fetched again
+        stats, _ = fetch_sentinel_stats(polygon_coords, interval=(acquisition_date, acquisition_date))
+        store.add_indicator_stats(field_id, acquisition_date, stats)
+    return missing
+
+
+def record_weather(field_id, temperature, humidity, store=store):
+    """
+    Store today's weather reading of a field.
+    """
+    store.add_weather(field_id, date.today().isoformat(), temperature, humidity)
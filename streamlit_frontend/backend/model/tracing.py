@@ -0,0 +1,271 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Write the metrics in Prometheus text format to this file when the process exits, the spans next to it
+DUMP_PATH = os.getenv("TRACING_DUMP_PATH")
+# Finished spans kept for inspection and dumps
+MAX_SPANS = int(os.getenv("TRACING_MAX_SPANS", 2048))
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB to 1 GiB
+PIXELS_BUCKETS = tuple(10 ** i for i in range(2, 9))
+
+HELP = {
+    "pipeline_stage_duration_seconds": ("histogram", "Duration of pipeline stages"),
+    "pipeline_stage_bytes": ("histogram", "Bytes downloaded or read per stage call"),
+    "pipeline_stage_pixels": ("histogram", "Raster pixels handled per stage call"),
+    "pipeline_cache_requests_total": ("counter", "Cache lookups per stage by result"),
+    "pipeline_stage_errors_total": ("counter", "Stage calls that raised"),
+}
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense: counts per upper bound, plus sum and count.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """
+    Thread-safe registry of histograms and counters, keyed by metric name and labels.
+    """
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self.spans = deque(maxlen=max_spans)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_span(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.spans.clear()
+
+    def summary(self):
+        """
+        Count, total and mean duration in seconds per stage, slowest total first.
+        """
+        stages = {}
+        with self._lock:
+            for (name, labels), histogram in self._histograms.items():
+                if name == "pipeline_stage_duration_seconds":
+                    # summed over the other labels of the stage
+                    row = stages.setdefault(dict(labels)["stage"], [0, 0.0])
+                    row[0] += histogram.count
+                    row[1] += histogram.sum
+        rows = sorted(stages.items(), key=lambda item: item[1][1], reverse=True)
+        return [{"stage": stage, "count": count, "total": total, "mean": total / count} for stage, (count, total) in rows]
+
+    def prometheus_text(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in histograms:
+            describe(name)
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum!r}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_labels(labels)} {value!r}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, spans_path=None):
+        """
+        Write the metrics in Prometheus text format to path, and the recent spans as JSON lines to spans_path.
+        """
+        _write_atomic(path, self.prometheus_text())
+        if spans_path:
+            with self._lock:
+                spans = list(self.spans)
+            _write_atomic(spans_path, "".join(json.dumps(span, default=str) + "\n" for span in spans))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+metrics = Metrics()
+_local = threading.local()
+
+
+class Span:
+    """
+    A timed pipeline stage. Measurements are attached with set(): bytes, pixels and cache ("hit" or "miss")
+    feed the histograms and counters, any other attribute is only kept on the span record.
+    """
+
+    __slots__ = ("stage", "labels", "attributes", "parent", "start", "duration")
+
+    def __init__(self, stage, labels, parent):
+        self.stage = stage
+        self.labels = labels
+        self.attributes = {}
+        self.parent = parent
+        self.start = time.time()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def add(self, name, value):
+        # accumulate, e.g. bytes over several downloads
+        self.attributes[name] = self.attributes.get(name, 0) + value
+        return self
+
+
+def current_span():
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def span(stage, **labels):
+    """
+    Time the enclosed block as a pipeline stage. Labels become Prometheus labels, keep them low-cardinality.
+
+        with span("sentinel.request") as s:
+            s.set(bytes=len(content), pixels=width * height, cache="miss")
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1].stage if stack else None
+    current = Span(stage, labels, parent)
+    stack.append(current)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        stack.pop()
+        _finish(current, error)
+
+
+def _finish(current, error):
+    labels = dict(current.labels, stage=current.stage)
+    metrics.observe("pipeline_stage_duration_seconds", current.duration, DURATION_BUCKETS, **labels)
+
+    attributes = current.attributes
+    if "bytes" in attributes:
+        metrics.observe("pipeline_stage_bytes", attributes["bytes"], BYTES_BUCKETS, **labels)
+    if "pixels" in attributes:
+        metrics.observe("pipeline_stage_pixels", attributes["pixels"], PIXELS_BUCKETS, **labels)
+    if "cache" in attributes:
+        metrics.inc("pipeline_cache_requests_total", result=attributes["cache"], **labels)
+    if error is not None:
+        metrics.inc("pipeline_stage_errors_total", **labels)
+
+    metrics.record_span({
+        "stage": current.stage,
+        "labels": current.labels,
+        "parent": current.parent,
+        "start": current.start,
+        "duration": current.duration,
+        "thread": threading.current_thread().name,
+        "error": None if error is None else f"{type(error).__name__}: {error}",
+        **attributes,
+    })
+
+
+def traced(stage, **labels):
+    """
+    Decorator that runs every call of the function in a span.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, **labels):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+if DUMP_PATH:
+    atexit.register(metrics.dump, DUMP_PATH, DUMP_PATH + ".spans.jsonl")
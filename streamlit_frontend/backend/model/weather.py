@@ -1,76 +1,66 @@
 import os
 from dotenv import load_dotenv
-import requests
 import datetime
 import math
+import threading
+
+from backend.model.concurrency import OPENWEATHER_HOST
+from backend.model.geometry import polygon_centroid
+from backend.model.http_client import client as http_client
+from backend.model.tracing import span
+from backend.model.weather_cache import current_cache, forecast_cache, get_cached
 
 load_dotenv()
 
 API_KEY = os.getenv("OPEN_WEATHER_API")
 
+BASE_URL = f"https://{OPENWEATHER_HOST}/data/2.5"
 
-def polygon_centroid(polygon_coords):
-    """
-    Calculate the centroid (geometric center) of a polygon given its coordinates.
-
-    Parameters:
-    polygon_coords (list of lists): A list of [longitude, latitude] pairs representing the vertices of the polygon.
-
-    Returns:
-    tuple: The (longitude, latitude) of the centroid.
-    """
-    n = len(polygon_coords)
-    if n == 0:
-        raise ValueError("The polygon must have at least one vertex.")
 
-    # Initialize sums
-    sum_x = 0
-    sum_y = 0
-    sum_area = 0
-
-    # Iterate over each vertex and calculate the centroid
-    for i in range(n):
-        x0, y0 = polygon_coords[i]
-        x1, y1 = polygon_coords[(i + 1) % n]
-        cross_product = x0 * y1 - x1 * y0
-        sum_x += (x0 + x1) * cross_product
-        sum_y += (y0 + y1) * cross_product
-        sum_area += cross_product
+# Function to get current weather data by coordinates
+def get_current_weather(api_key, lat, lon):
+    params = {"lat": lat, "lon": lon, "appid": api_key, "units": "metric"}
+    return _get_json("weather", params)
 
-    # Calculate the area of the polygon
-    area = 0.5 * sum_area
 
-    if area == 0:
-        raise ValueError("The polygon has zero area.")
+# Function to get forecasted weather data by coordinates
+def get_forecast_weather(api_key, lat, lon):
+    params = {"lat": lat, "lon": lon, "appid": api_key, "units": "metric"}
+    return _get_json("forecast", params)
 
-    # Calculate the centroid
-    centroid_x = sum_x / (6 * area)
-    centroid_y = sum_y / (6 * area)
 
-    return centroid_x, centroid_y
+def _get_json(endpoint, params):
+    with span("weather.request", endpoint=endpoint) as request_span:
+        response = http_client.get(f"{BASE_URL}/{endpoint}", params=params)
+        request_span.set(bytes=len(response.content))
+        return response.json()
 
 
-# Function to get current weather data by coordinates
-def get_current_weather(api_key, lat, lon):
-    url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-    response = requests.get(url)
-    data = response.json()
-    return data
+def _get_cached(stage, cache, lat, lon, fetch):
+    # A call counts as a miss when it had to run the request itself. Stale entries are served as hits and
+    # refreshed on another thread later, in a weather.refresh span of their own.
+    caller = threading.get_ident()
+    with span(stage) as cache_span:
+        cache_span.set(cache="hit")
 
+        def load(la, lo):
+            if threading.get_ident() == caller:
+                cache_span.set(cache="miss")
+            return fetch(la, lo)
 
-# Function to get forecasted weather data by coordinates
-def get_forecast_weather(api_key, lat, lon):
-    url = f"http://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-    response = requests.get(url)
-    data = response.json()
-    return data
+        return get_cached(cache, lat, lon, load)
 
 
 # Main function to check for rain
 def check_for_rain(lat, lon):
     api_key = API_KEY
-    current_weather = get_current_weather(api_key, lat, lon)
-    forecast_weather = get_forecast_weather(api_key, lat, lon)
+    # Neighbouring fields share the cached weather of their grid cell
+    current_weather = _get_cached(
+        "weather.current", current_cache, lat, lon, lambda la, lo: get_current_weather(api_key, la, lo)
+    )
+    forecast_weather = _get_cached(
+        "weather.forecast", forecast_cache, lat, lon, lambda la, lo: get_forecast_weather(api_key, la, lo)
+    )
 
     # Extract relevant data from current weather
     current_precipitation = current_weather.get("rain", {}).get(
@@ -88,7 +78,6 @@ def check_for_rain(lat, lon):
     # get current temperature and humidity
     current_temp = current_weather.get("main", {}).get("temp")
     current_humidity = current_weather.get("main", {}).get("humidity")
-    print(current_temp, current_humidity)
 
     # Determine irrigation need
     if current_precipitation > 5 or forecasted_precipitation > 10:
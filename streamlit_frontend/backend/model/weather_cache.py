@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.model.singleflight import SingleFlight
+from backend.model.tracing import span
+
+# Size of a grid cell in degrees; all fields inside one cell share their weather (0.01° is about 1 km)
+GRID_CELL_DEG = float(os.getenv("WEATHER_GRID_CELL_DEG", 0.01))
+# Seconds a response is considered fresh
+CURRENT_TTL = float(os.getenv("WEATHER_CURRENT_TTL", 10 * 60))
+FORECAST_TTL = float(os.getenv("WEATHER_FORECAST_TTL", 60 * 60))
+# Seconds after expiry during which the old response is still served while a refresh runs in the background
+STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", 3 * 60 * 60))
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-refresh")
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with stale-while-revalidate semantics.
+    Concurrent misses for the same key are coalesced into a single load.
+    """
+
+    def __init__(self, ttl, stale_ttl=0, max_entries=4096, name="cache"):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def _load(self, key, loader):
+        value = loader()
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _refresh(self, key, loader):
+        # runs after the caller got the stale value, so it is timed on its own
+        try:
+            with span("weather.refresh", cache=self.name):
+                self._flight.do(key, self._load, key, loader)
+        except Exception:
+            # keep serving the stale value, the next request retries
+            pass
+
+    def get(self, key, loader):
+        """
+        Return the value for key, calling loader() if it is missing or too old.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            value, loaded_at = entry
+            age = time.monotonic() - loaded_at
+            if age < self.ttl:
+                return value
+            if age < self.ttl + self.stale_ttl:
+                if not self._flight.in_flight(key):
+                    _refresh_executor.submit(self._refresh, key, loader)
+                return value
+
+        return self._flight.do(key, self._load, key, loader)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+current_cache = TTLCache(CURRENT_TTL, STALE_TTL, name="current")
+forecast_cache = TTLCache(FORECAST_TTL, STALE_TTL, name="forecast")
+
+
+def grid_cell(lat, lon, cell_size=GRID_CELL_DEG):
+    """
+    Index of the grid cell containing the coordinates.
+    """
+    return round(lat / cell_size), round(lon / cell_size)
+
+
+def get_cached(cache, lat, lon, fetch):
+    """
+    Return the response for the grid cell containing (lat, lon) from cache.
+    On a miss fetch(lat, lon) is called with the cell center, so every field in the cell gets the same data.
+    """
+    cell = grid_cell(lat, lon)
+    cell_lat, cell_lon = cell[0] * GRID_CELL_DEG, cell[1] * GRID_CELL_DEG
+    return cache.get(cell, lambda: fetch(round(cell_lat, 6), round(cell_lon, 6)))
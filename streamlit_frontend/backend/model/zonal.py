@@ -0,0 +1,201 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Default histogram bin edges, covering the range of the normalized difference indices
+HISTOGRAM_EDGES = np.linspace(-1.0, 1.0, 21)
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.number))
+
+
+def _is_sequence(value):
+    return isinstance(value, (list, tuple, np.ndarray))
+
+
+def polygon_rings(polygon_coords):
+    """
+    Flatten GeoJSON-style coordinates into a list of rings.
+    Accepts a single ring, a polygon (list of rings, holes included) or a multipolygon (list of polygons).
+    """
+    if not _is_sequence(polygon_coords):
+        raise ValueError(f"Expected nested lists of [longitude, latitude] pairs, got {type(polygon_coords).__name__}")
+    if len(polygon_coords) == 0:
+        return []
+    first = polygon_coords[0]
+    if _is_sequence(first) and len(first) > 0 and _is_number(first[0]):
+        return [polygon_coords]
+    rings = []
+    for part in polygon_coords:
+        rings.extend(polygon_rings(part))
+    return rings
+
+
+def _freeze(polygon_coords):
+    return tuple(tuple(map(tuple, ring)) for ring in polygon_rings(polygon_coords))
+
+
+def _rasterize(rings, bbox, shape):
+    # Even-odd scanline fill at pixel centers: every edge toggles the pixels to the right of
+    # where it crosses a row, and a cumulative sum along the row gives the parity.
+    min_lon, min_lat, max_lon, max_lat = bbox
+    height, width = shape
+    dx = (max_lon - min_lon) / width
+    dy = (max_lat - min_lat) / height
+
+    toggles = np.zeros((height, width + 1), dtype=np.int32)
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)
+        # ring in pixel space, with pixel (r, c) centered at (u=c, v=r)
+        u = (ring[:, 0] - min_lon) / dx - 0.5
+        v = (max_lat - ring[:, 1]) / dy - 0.5
+        u0, v0, u1, v1 = u, v, np.roll(u, -1), np.roll(v, -1)
+
+        first_row = np.clip(np.ceil(np.minimum(v0, v1)), 0, height).astype(np.intp)
+        end_row = np.clip(np.ceil(np.maximum(v0, v1)), 0, height).astype(np.intp)
+        counts = end_row - first_row
+        if counts.sum() == 0:
+            continue
+
+        edge = np.repeat(np.arange(len(u0)), counts)
+        rows = first_row[edge] + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        t = (rows - v0[edge]) / (v1[edge] - v0[edge])
+        crossing = u0[edge] + t * (u1[edge] - u0[edge])
+        cols = np.clip(np.floor(crossing).astype(np.intp) + 1, 0, width)
+        np.add.at(toggles, (rows, cols), 1)
+
+    return (np.cumsum(toggles, axis=1)[:, :width] & 1).astype(bool)
+
+
+@lru_cache(maxsize=256)
+def _cached_mask(frozen_rings, bbox, shape):
+    mask = _rasterize(frozen_rings, bbox, shape)
+    mask.flags.writeable = False
+    return mask
+
+
+def polygon_mask(polygon_coords, bbox, shape):
+    """
+    Boolean mask of the raster pixels whose center lies inside the polygon.
+    Masks are cached per polygon and raster grid, the returned array is read-only.
+    :param polygon_coords: Ring, polygon or multipolygon coordinates as [longitude, latitude] pairs
+    :param bbox: Raster extent as [min_lon, min_lat, max_lon, max_lat]
+    :param shape: Raster (height, width), row 0 being the northern edge
+    """
+    return _cached_mask(_freeze(polygon_coords), tuple(bbox), tuple(shape[:2]))
+
+
+def label_image(polygons, bbox, shape):
+    """
+    Label image with 0 for background and i + 1 for pixels of polygons[i].
+    Where polygons overlap the later polygon wins, see overlapped_zones.
+    """
+    labels = np.zeros(shape[:2], dtype=np.int32)
+    for i, polygon_coords in enumerate(polygons):
+        labels[polygon_mask(polygon_coords, bbox, shape)] = i + 1
+    return labels
+
+
+def overlapped_zones(polygons, bbox, shape, labels):
+    """
+    Indices of the polygons that lost pixels of their own mask to a later polygon in labels,
+    e.g. fields nested in, duplicated by or overlapping a later field. Their statistics have to come
+    from their own mask instead of the label image.
+    """
+    labelled = np.bincount(labels.ravel(), minlength=len(polygons) + 1)[1:]
+    mask_pixels = np.array([np.count_nonzero(polygon_mask(coords, bbox, shape)) for coords in polygons], dtype=np.intp)
+    if mask_pixels.sum() == labelled.sum():
+        return []
+    return np.flatnonzero(labelled < mask_pixels).tolist()
+
+
+def zonal_stats(values, labels, n_zones, cloud=None, percentiles=PERCENTILES, histogram_edges=HISTOGRAM_EDGES):
+    """
+    Reduce a raster over every zone of a label image in one vectorized pass. NaN pixels count as no data.
+    :param values: 2D raster of index values
+    :param labels: Int raster of the same shape, 0 for background and 1..n_zones for the zones
+    :param n_zones: Number of zones
+    :param cloud: Optional raster of the same shape, non-zero where a pixel is cloudy
+    :param percentiles: Percentiles to compute, in [0, 100]
+    :param histogram_edges: Bin edges of the value histogram, values outside are counted in the outer bins
+    :return:
+    Dict of arrays with one entry per zone: "mean", "median", "p<q>" per percentile, "pixels" (zone size),
+    "valid_pixels", "valid_fraction", "cloud_fraction" and "histogram" of shape (n_zones, n_bins).
+    Statistics of zones without valid pixels are NaN.
+    """
+    labels = np.asarray(labels).ravel()
+    values = np.asarray(values, dtype=np.float64).ravel()
+    in_zone = (labels > 0) & (labels <= n_zones)
+    valid = in_zone & np.isfinite(values)
+    valid_labels = labels[valid]
+    valid_values = values[valid]
+
+    pixels = np.bincount(labels[in_zone], minlength=n_zones + 1)[1:]
+    valid_pixels = np.bincount(valid_labels, minlength=n_zones + 1)[1:]
+    sums = np.bincount(valid_labels, weights=valid_values, minlength=n_zones + 1)[1:]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats = {
+            "pixels": pixels,
+            "valid_pixels": valid_pixels,
+            "valid_fraction": np.where(pixels > 0, valid_pixels / np.maximum(pixels, 1), 0.0),
+            "mean": np.where(valid_pixels > 0, sums / np.maximum(valid_pixels, 1), np.nan),
+        }
+
+    if cloud is not None:
+        cloudy = np.asarray(cloud).ravel()[in_zone] > 0
+        cloudy_pixels = np.bincount(labels[in_zone], weights=cloudy, minlength=n_zones + 1)[1:]
+        stats["cloud_fraction"] = np.where(pixels > 0, cloudy_pixels / np.maximum(pixels, 1), np.nan)
+
+    # Percentiles: sort the valid pixels by zone, then by value, and interpolate inside each zone's run
+    order = np.lexsort((valid_values, valid_labels))
+    sorted_values = valid_values[order]
+    starts = np.cumsum(valid_pixels) - valid_pixels
+    has_data = valid_pixels > 0
+    for q in percentiles:
+        position = starts + (q / 100.0) * np.maximum(valid_pixels - 1, 0)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.ceil(position).astype(np.intp)
+        result = np.full(n_zones, np.nan)
+        if has_data.any():
+            low_values = sorted_values[lower[has_data]]
+            high_values = sorted_values[upper[has_data]]
+            result[has_data] = low_values + (position[has_data] - lower[has_data]) * (high_values - low_values)
+        stats[f"p{q}"] = result
+    stats["median"] = stats["p50"] if 50 in percentiles else _median(sorted_values, starts, valid_pixels)
+
+    n_bins = len(histogram_edges) - 1
+    bins = np.clip(np.digitize(valid_values, histogram_edges) - 1, 0, n_bins - 1)
+    histogram = np.bincount(valid_labels * n_bins + bins, minlength=(n_zones + 1) * n_bins)
+    stats["histogram"] = histogram.reshape(n_zones + 1, n_bins)[1:]
+
+    return stats
+
+
+def _median(sorted_values, starts, counts):
+    result = np.full(len(counts), np.nan)
+    has_data = counts > 0
+    lower = starts + (counts - 1) // 2
+    upper = starts + counts // 2
+    result[has_data] = (sorted_values[lower[has_data]] + sorted_values[upper[has_data]]) / 2
+    return result
+
+
+def zone_row(stats, i):
+    """
+    Statistics of zone i (0-based) as a dict of scalars, the histogram as a list.
+    """
+    row = {}
+    for name, column in stats.items():
+        value = column[i]
+        row[name] = value.tolist() if isinstance(value, np.ndarray) else value.item()
+    return row
+
+
+def masked_stats(values, mask, cloud=None):
+    """
+    Statistics of the pixels inside a single boolean mask, see zonal_stats.
+    """
+    return zone_row(zonal_stats(values, mask.astype(np.int32), 1, cloud=cloud), 0)
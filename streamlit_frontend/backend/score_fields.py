@@ -0,0 +1,234 @@
+"""
+Score a whole catalog of fields without the Streamlit UI.
+
+Fields are read as a stream from a GeoJSON FeatureCollection, a GeoJSON sequence or a GeoParquet file and
+scored chunk by chunk with the same fetch, zonal statistics, weather and model pipeline as predict_on_polygon.
+Results are appended to newline-delimited JSON, or written as Parquet part files, after every chunk together
+with a checkpoint, so an interrupted run continues where it stopped.
+
+Run from streamlit_frontend:
+    python -m backend.score_fields fields.geojson recommendations.ndjson
+"""
+import json
+import os
+import tempfile
+import time
+from itertools import islice
+
+import click
+
+from backend.model.catalog import read_fields
+from backend.model.geometry import validate_polygon
+from backend.model.predict import prediction_record, predict_on_polygons
+from backend.model.tracing import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = pq = None
+
+# Fields scored together; polygons of a chunk share tiles, and memory use is bounded by the chunk
+CHUNK_SIZE = 256
+
+COLUMNS = ("index", "field_id", "irrigate", "evi", "moisture_stress", "temperature", "humidity", "error")
+
+
+def _row(field, result=None, error=None):
+    row = dict.fromkeys(COLUMNS)
+    row["index"] = field.index
+    row["field_id"] = field.field_id
+    if result is not None:
+        row.update(prediction_record(result))
+    if error is not None:
+        row["error"] = f"{type(error).__name__}: {error}" if isinstance(error, Exception) else str(error)
+    return row
+
+
+def score_fields(fields, max_workers=8):
+    """
+    Score a chunk of fields.
+    :param fields: List of catalog.Field
+    :param max_workers: Number of tiles and fields processed at the same time
+    :return: Generator of result rows in completion order
+    """
+    scorable = {}
+    for field in fields:
+        if not field.coordinates:
+            yield _row(field, error="Unsupported or empty geometry")
+            continue
+        # a malformed feature gets an error row, the rest of the chunk is still scored
+        try:
+            validate_polygon(field.coordinates)
+        except (TypeError, ValueError, IndexError) as e:
+            yield _row(field, error=f"Invalid geometry: {e}")
+            continue
+        scorable[field.index] = field
+
+    coordinates = {index: field.coordinates for index, field in scorable.items()}
+    for index, result, error in predict_on_polygons(coordinates, max_workers=max_workers):
+        yield _row(scorable[index], result, error)
+
+
+def _write_atomic(path, write):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class Checkpoint:
+    """
+    Progress of a run: position is the number of input fields whose results are written, offset the size of the
+    NDJSON output at that point. Saved next to the output as <output>.checkpoint.
+    """
+
+    def __init__(self, path, input_path, position=0, offset=0):
+        self.path = path
+        self.input_path = input_path
+        self.position = position
+        self.offset = offset
+
+    @classmethod
+    def load(cls, path, input_path):
+        """
+        The saved checkpoint of a run over input_path, or a fresh one if there is none.
+        """
+        try:
+            with open(path, encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return cls(path, input_path)
+        if state.get("input") != os.path.abspath(input_path):
+            return cls(path, input_path)
+        return cls(path, input_path, state["position"], state["offset"])
+
+    def save(self):
+        state = {"input": os.path.abspath(self.input_path), "position": self.position, "offset": self.offset}
+        _write_atomic(self.path, lambda file: file.write(json.dumps(state).encode("utf-8")))
+
+
+class NdjsonWriter:
+    """
+    Appends rows to a newline-delimited JSON file. Anything written after the checkpoint is truncated first.
+    """
+
+    def __init__(self, path, checkpoint):
+        self.file = open(path, "r+b" if os.path.exists(path) else "wb")
+        self.file.truncate(checkpoint.offset)
+        self.file.seek(checkpoint.offset)
+
+    def write(self, row):
+        self.file.write(json.dumps(row, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def commit(self, first_index):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """
+    Writes the rows of every chunk as a Parquet part file into a directory, named after the chunk's first
+    input index so that a resumed run replaces a partially written chunk.
+    """
+
+    def __init__(self, directory, checkpoint):
+        if pa is None:
+            raise click.UsageError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.schema = pa.schema([
+            ("index", pa.int64()), ("field_id", pa.string()), ("irrigate", pa.bool_()), ("evi", pa.float64()),
+            ("moisture_stress", pa.float64()), ("temperature", pa.float64()), ("humidity", pa.float64()),
+            ("error", pa.string()),
+        ])
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        if checkpoint.position == 0:
+            for name in os.listdir(directory):
+                if name.startswith("part-") and name.endswith(".parquet"):
+                    os.unlink(os.path.join(directory, name))
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(dict(row, field_id=None if row["field_id"] is None else str(row["field_id"])))
+
+    def commit(self, first_index):
+        if self.rows:
+            table = pa.Table.from_pylist(sorted(self.rows, key=lambda row: row["index"]), schema=self.schema)
+            path = os.path.join(self.directory, f"part-{first_index:09d}.parquet")
+            _write_atomic(path, lambda file: pq.write_table(table, file))
+            self.rows = []
+        return 0
+
+    def close(self):
+        pass
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@click.command()
+@click.argument("input_path", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_path", type=click.Path())
+@click.option("--format", "output_format", type=click.Choice(["ndjson", "parquet"]), default=None,
+              help="Output format, by default picked from the output extension (.parquet writes a directory).")
+@click.option("--chunk-size", default=CHUNK_SIZE, show_default=True,
+              help="Fields scored and checkpointed together.")
+@click.option("--workers", default=8, show_default=True, help="Tiles and fields processed at the same time.")
+@click.option("--restart", is_flag=True, help="Ignore an existing checkpoint and score the catalog from the start.")
+@click.option("--metrics", "metrics_path", type=click.Path(dir_okay=False), default=None,
+              help="Write per-stage metrics in Prometheus text format here, with the spans next to it as JSON lines.")
+def main(input_path, output_path, output_format, chunk_size, workers, restart, metrics_path):
+    """
+    Score every field in INPUT_PATH and write irrigation recommendations to OUTPUT_PATH.
+    """
+    if output_format is None:
+        output_format = "parquet" if output_path.lower().endswith(".parquet") else "ndjson"
+
+    checkpoint_path = output_path.rstrip("/\\") + ".checkpoint"
+    if restart and os.path.exists(checkpoint_path):
+        os.unlink(checkpoint_path)
+    checkpoint = Checkpoint.load(checkpoint_path, input_path)
+    if checkpoint.position:
+        click.echo(f"Resuming after {checkpoint.position} fields", err=True)
+
+    writer_class = ParquetWriter if output_format == "parquet" else NdjsonWriter
+    writer = writer_class(output_path, checkpoint)
+    started = time.monotonic()
+    scored = failed = 0
+    try:
+        fields = islice(read_fields(input_path), checkpoint.position, None)
+        for chunk in _chunks(fields, chunk_size):
+            for row in score_fields(chunk, max_workers=workers):
+                writer.write(row)
+                scored += 1
+                failed += row["error"] is not None
+
+            checkpoint.offset = writer.commit(chunk[0].index)
+            checkpoint.position = chunk[-1].index + 1
+            checkpoint.save()
+            rate = scored / max(time.monotonic() - started, 1e-9)
+            click.echo(f"{checkpoint.position} fields done ({failed} failed, {rate:.1f} fields/s)", err=True)
+    finally:
+        writer.close()
+        if metrics_path:
+            metrics.dump(metrics_path, spans_path=metrics_path + ".spans.jsonl")
+
+    click.echo(f"Scored {scored} fields, {failed} failed", err=True)
+
+
+if __name__ == "__main__":
+    main()
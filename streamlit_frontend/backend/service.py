@@ -0,0 +1,263 @@
+"""
+Local HTTP service for the prediction pipeline, so several frontends and scripts share one warm process.
+
+A plain ASGI application without a web framework. The model is loaded once at startup, predictions run on a
+worker thread pool, and concurrent requests for the same polygon and time window share one upstream fetch.
+
+Endpoints:
+    GET  /health          status, whether the model is loaded and the number of predictions in flight
+    GET  /metrics         per-stage durations, bytes, pixels and cache results in Prometheus text format
+    POST /predict         {"geometry" | "coordinates": ..., "time_interval": [start, end]} -> prediction
+    POST /predict/batch   {"fields": [{"id": ..., "geometry" | "coordinates": ...}], "time_interval": [...]}
+
+Run from streamlit_frontend:
+    python -m backend.service
+or
+    uvicorn backend.service:app --port 8000
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from backend.model.geometry import geometry_key, validate_polygon
+from backend.model.irrigation import last_days
+from backend.model.predict import prediction_record, predict_on_polygon, predict_on_polygons
+from backend.model.registry import get_compiled_model
+from backend.model.singleflight import AsyncSingleFlight
+from backend.model.tracing import metrics as pipeline_metrics
+
+HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+PORT = int(os.getenv("SERVICE_PORT", 8000))
+WORKERS = int(os.getenv("SERVICE_WORKERS", 8))
+MAX_BATCH = int(os.getenv("SERVICE_MAX_BATCH", 1000))
+MAX_BODY_BYTES = int(os.getenv("SERVICE_MAX_BODY_BYTES", 16 * 1024 * 1024))
+# Days of Sentinel-2 data used when a request gives no time_interval
+DEFAULT_DAYS = 10
+
+POLYGON_TYPES = ("Polygon", "MultiPolygon")
+
+# All pipeline work runs on executor. Batches are coordinated from batch_executor, whose threads only wait for
+# their results on executor, so concurrent batches share its WORKERS threads instead of starting pools of their own
+executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="service")
+batch_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="service-batch")
+flights = AsyncSingleFlight()
+state = {"model_loaded": False}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _coordinates(field):
+    # Accept a GeoJSON feature, a geometry or bare polygon coordinates
+    if not isinstance(field, dict):
+        raise HTTPError(400, "Expected a JSON object")
+    if "coordinates" in field and "type" not in field:
+        coordinates = field["coordinates"]
+    else:
+        geometry = field.get("geometry", field)
+        if not isinstance(geometry, dict) or geometry.get("type") not in POLYGON_TYPES:
+            raise HTTPError(400, "Expected a Polygon or MultiPolygon geometry")
+        coordinates = geometry.get("coordinates")
+    if not isinstance(coordinates, list) or not coordinates:
+        raise HTTPError(400, "Missing polygon coordinates")
+    return coordinates
+
+
+def _interval(body):
+    interval = body.get("time_interval")
+    if interval is None:
+        return last_days(DEFAULT_DAYS)
+    try:
+        start, end = (date.fromisoformat(day) for day in interval)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "time_interval must be [start, end] as YYYY-MM-DD")
+    if start > end:
+        raise HTTPError(400, "time_interval starts after it ends")
+    return start.isoformat(), end.isoformat()
+
+
+def _key(coordinates, interval):
+    # bad geometry is rejected here rather than failing inside the pipeline
+    try:
+        validate_polygon(coordinates)
+        return geometry_key(coordinates), interval
+    except (TypeError, ValueError, IndexError) as e:
+        raise HTTPError(400, f"Invalid polygon coordinates: {e}")
+
+
+async def predict(body):
+    coordinates = _coordinates(body)
+    interval = _interval(body)
+    key = _key(coordinates, interval)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, predict_on_polygon, coordinates, interval)
+
+    result = await flights.do(key, run)
+    return {"field_id": key[0], "time_interval": list(interval), **prediction_record(result)}
+
+
+def _score_batch(loop, futures, coordinates, interval):
+    # Runs on the batch pool; the claimed polygons are fetched together, sharing tiles, on the worker pool
+    def resolve(future, result, error):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    failure = RuntimeError("No prediction was returned for the polygon")
+    try:
+        for key, result, error in predict_on_polygons(coordinates, interval=interval, executor=executor):
+            loop.call_soon_threadsafe(resolve, futures[key], result, error)
+    except Exception as e:
+        failure = e
+    # complete whatever is left, the results above are set first
+    for future in futures.values():
+        loop.call_soon_threadsafe(resolve, future, None, failure)
+
+
+async def predict_batch(body):
+    fields = body.get("fields")
+    if not isinstance(fields, list):
+        raise HTTPError(400, "Expected a list of fields")
+    if len(fields) > MAX_BATCH:
+        raise HTTPError(413, f"At most {MAX_BATCH} fields per batch")
+    interval = _interval(body)
+    keys = []
+    coordinates = {}
+    for field in fields:
+        # invalid fields get their own error, the rest of the batch is still scored
+        try:
+            field_coordinates = _coordinates(field)
+            key = _key(field_coordinates, interval)
+        except HTTPError as e:
+            keys.append(e)
+            continue
+        keys.append(key)
+        coordinates.setdefault(key, field_coordinates)
+
+    # Polygons already in flight are awaited, the others are scored here in one pipeline run
+    futures, claimed = flights.claim(list(coordinates))
+    if claimed:
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(
+            batch_executor, _score_batch, loop, {key: futures[key] for key in claimed},
+            {key: coordinates[key] for key in claimed}, interval,
+        )
+
+    results = []
+    for field, key in zip(fields, keys):
+        if isinstance(key, HTTPError):
+            results.append({"id": field.get("id") if isinstance(field, dict) else None, "error": str(key)})
+            continue
+        record = {"id": field.get("id"), "field_id": key[0]}
+        try:
+            record.update(prediction_record(await asyncio.shield(futures[key])))
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        results.append(record)
+    return {"time_interval": list(interval), "results": results}
+
+
+async def health(body):
+    return {"status": "ok", "model_loaded": state["model_loaded"], "in_flight": len(flights)}
+
+
+async def metrics(body):
+    return pipeline_metrics.prometheus_text()
+
+
+ROUTES = {
+    ("GET", "/health"): health,
+    ("GET", "/metrics"): metrics,
+    ("POST", "/predict"): predict,
+    ("POST", "/predict/batch"): predict_batch,
+}
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise asyncio.CancelledError()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        if not message.get("more_body", False):
+            return bytes(body)
+
+
+async def _respond(send, status, payload):
+    # handlers return JSON-serializable objects, or text for the Prometheus exposition format
+    if isinstance(payload, str):
+        body = payload.encode("utf-8")
+        content_type = b"text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body = json.dumps(payload).encode("utf-8")
+        content_type = b"application/json"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                # load and compile the model before the first request
+                await asyncio.get_running_loop().run_in_executor(executor, get_compiled_model)
+                state["model_loaded"] = True
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            batch_executor.shutdown(wait=False, cancel_futures=True)
+            executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    try:
+        if handler is None:
+            allowed = any(path == scope["path"] for _, path in ROUTES)
+            raise HTTPError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+        body = await _read_body(receive)
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            raise HTTPError(400, "Invalid JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Expected a JSON object")
+        await _respond(send, 200, await handler(payload))
+    except HTTPError as e:
+        await _respond(send, e.status, {"error": str(e)})
+    except Exception as e:
+        await _respond(send, 500, {"error": f"{type(e).__name__}: {e}"})
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=HOST, port=PORT)
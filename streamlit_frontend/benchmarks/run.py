@@ -0,0 +1,259 @@
+"""
+Benchmarks for the prediction pipeline against the local stand-in APIs of benchmarks.stub_server.
+
+Every stage runs on cold caches for several polygon sizes and counts:
+    zonal       label image and zonal statistics of the four indicators, no I/O
+    model_load  loading and compiling the irrigation model
+    sentinel    fetch_sentinel_data for one polygon
+    weather     check_for_rain at the polygon's centroid
+    predict     predict_on_polygon end to end
+    batch       predict_on_polygons for many polygons, reported as fields per second
+
+Results can be saved as a baseline and compared against one, so regressions show up without API quota.
+The time spent in each traced pipeline stage (backend.model.tracing) is printed after the run.
+
+Run from streamlit_frontend:
+    python -m benchmarks.run --latency-ms 150 --jitter-ms 40 --save-baseline benchmarks/baselines/local.json
+    python -m benchmarks.run --latency-ms 150 --jitter-ms 40 --compare benchmarks/baselines/local.json
+"""
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+import click
+import numpy as np
+from sentinelhub import DataCollection
+
+from backend.model import raster_cache, registry, scrap_sentinel, weather, weather_cache, zonal
+from backend.model.tracing import metrics
+from backend.model.irrigation import fetch_sentinel_data, indicators
+from backend.model.predict import predict_on_polygon, predict_on_polygons
+from backend.model.tiles import bbox_size_m
+from backend.model.weather import check_for_rain, polygon_centroid
+from benchmarks.stub_server import TOKEN_PATH, StubServer
+
+# Fixed window, so recorded Sentinel Hub fixtures keep matching
+TIME_INTERVAL = ("2024-06-01", "2024-06-10")
+CENTER = (16.2571, 52.6508)
+# Radius in meters of the benchmark polygons, roughly 1 ha, 30 ha and 7 km²
+SIZES = {"small": 60, "medium": 300, "large": 1500}
+PERCENTILES = (50, 90, 99)
+
+
+def make_polygon(center, radius_m, vertices=12):
+    lon, lat = center
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    d_lat = radius_m / 110574.0 * np.sin(angles)
+    d_lon = radius_m / (111320.0 * math.cos(math.radians(lat))) * np.cos(angles)
+    ring = np.column_stack([lon + d_lon, lat + d_lat]).tolist()
+    return ring + ring[:1]
+
+
+def make_polygons(count, radius_m, spread_m=4000, seed=0):
+    """
+    count polygons of the given radius scattered over a spread_m square around CENTER.
+    """
+    rng = np.random.default_rng(seed)
+    lon, lat = CENTER
+    offsets = rng.uniform(-spread_m / 2, spread_m / 2, size=(count, 2))
+    return [
+        make_polygon((lon + dx / (111320.0 * math.cos(math.radians(lat))), lat + dy / 110574.0), radius_m)
+        for dx, dy in offsets
+    ]
+
+
+def use_stub(url):
+    """
+    Point the pipeline at the stand-in server and disable the on-disk raster cache.
+    """
+    # the stand-in serves the OAuth token over plain http
+    os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
+    config = scrap_sentinel.config
+    config.sh_base_url = url
+    config.sh_token_url = f"{url}{TOKEN_PATH}"
+    config.sh_client_id = config.sh_client_id or "benchmark"
+    config.sh_client_secret = config.sh_client_secret or "benchmark"
+    scrap_sentinel.DATA_COLLECTION = DataCollection.SENTINEL2_L2A.define_from("SENTINEL2_L2A_STUB", service_url=url)
+    weather.BASE_URL = f"{url}/data/2.5"
+    weather.API_KEY = weather.API_KEY or "benchmark"
+    raster_cache.cache.directory = ""
+
+
+def reset_caches():
+    weather_cache.current_cache.clear()
+    weather_cache.forecast_cache.clear()
+    zonal._cached_mask.cache_clear()
+
+
+def summarize(durations, items=1):
+    durations = np.asarray(durations)
+    summary = {f"p{p}": float(np.percentile(durations, p)) for p in PERCENTILES}
+    summary["mean"] = float(durations.mean())
+    summary["runs"] = len(durations)
+    # items processed per second of wall time
+    summary["throughput"] = float(items * len(durations) / durations.sum()) if durations.sum() else math.inf
+    return summary
+
+
+def measure(fn, iterations, warmup=1, items=1):
+    for _ in range(warmup):
+        reset_caches()
+        fn()
+    durations = []
+    for _ in range(iterations):
+        reset_caches()
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations, items)
+
+
+def zonal_case(count, radius_m, resolution_m=10):
+    # A tile covering all polygons with synthetic index rasters at Sentinel-2 resolution
+    polygons = make_polygons(count, radius_m)
+    bbox = scrap_sentinel.polygon_to_bbox([[ring] for ring in polygons])
+    width_m, height_m = bbox_size_m(bbox)
+    shape = (max(1, int(height_m / resolution_m)), max(1, int(width_m / resolution_m)))
+    rng = np.random.default_rng(0)
+    rasters = [rng.uniform(-1, 1, shape).astype(np.float32) for _ in indicators]
+    cloud = (rng.random(shape) < 0.05).astype(np.uint8)
+
+    def run():
+        labels = zonal.label_image(polygons, bbox, shape)
+        for raster in rasters:
+            zonal.zonal_stats(raster, labels, len(polygons), cloud=cloud)
+
+    return run
+
+
+def run_benchmarks(sizes, counts, iterations):
+    results = {}
+
+    def record(stage, case, summary):
+        results[f"{stage}/{case}"] = summary
+        click.echo(
+            f"{stage:<11}{case:<16}" + "".join(f"{summary[f'p{p}'] * 1000:>10.1f}" for p in PERCENTILES)
+            + f"{summary['mean'] * 1000:>10.1f}{summary['throughput']:>12.2f}"
+        )
+
+    click.echo(f"{'stage':<11}{'case':<16}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES)
+               + f"{'mean ms':>10}{'per s':>12}")
+
+    def load_model():
+        registry.clear()
+        registry.get_compiled_model()
+
+    record("model_load", "-", measure(load_model, iterations))
+
+    for size in sizes:
+        radius = SIZES[size]
+        polygon = make_polygon(CENTER, radius)
+        lon, lat = polygon_centroid(polygon)
+
+        for count in counts:
+            record("zonal", f"{size}x{count}", measure(zonal_case(count, radius), iterations, items=count))
+        record("sentinel", size, measure(lambda: fetch_sentinel_data(polygon, TIME_INTERVAL), iterations))
+        record("weather", size, measure(lambda: check_for_rain(lat, lon), iterations))
+        record("predict", size, measure(lambda: predict_on_polygon(polygon, TIME_INTERVAL), iterations))
+
+        for count in counts:
+            polygons = make_polygons(count, radius)
+
+            def batch():
+                for _, _, error in predict_on_polygons(polygons, interval=TIME_INTERVAL):
+                    if error is not None:
+                        raise error
+
+            record("batch", f"{size}x{count}", measure(batch, iterations, items=count))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Stages whose median got slower than the baseline by more than threshold (a fraction).
+    """
+    regressions = []
+    click.echo(f"\n{'stage/case':<27}{'base p50':>10}{'p50':>10}{'change':>10}")
+    for name, summary in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        change = summary["p50"] / base["p50"] - 1 if base["p50"] else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        click.echo(f"{name:<27}{base['p50'] * 1000:>10.1f}{summary['p50'] * 1000:>10.1f}{change:>+10.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+@click.command()
+@click.option("--latency-ms", default=100.0, show_default=True, help="Mean added latency of every API response.")
+@click.option("--jitter-ms", default=20.0, show_default=True, help="Standard deviation of the added latency.")
+@click.option("--iterations", default=5, show_default=True, help="Measured runs per stage and case.")
+@click.option("--sizes", default="small,medium,large", show_default=True, help=f"Polygon sizes, of {', '.join(SIZES)}.")
+@click.option("--counts", default="1,10,50", show_default=True, help="Polygon counts for the zonal and batch stages.")
+@click.option("--fixtures", type=click.Path(file_okay=False), default=None,
+              help="Directory of recorded API responses to replay.")
+@click.option("--record", is_flag=True, help="Forward unmatched requests to the real APIs and save them as fixtures.")
+@click.option("--save-baseline", type=click.Path(dir_okay=False), default=None, help="Write the results as a baseline.")
+@click.option("--compare", "baseline_path", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="Compare the results against a saved baseline; exits with status 1 on regressions.")
+@click.option("--threshold", default=0.2, show_default=True, help="Allowed slowdown of the median before a regression.")
+@click.option("--metrics", "metrics_path", type=click.Path(dir_okay=False), default=None,
+              help="Write per-stage metrics in Prometheus text format here, with the spans next to it as JSON lines.")
+def main(latency_ms, jitter_ms, iterations, sizes, counts, fixtures, record, save_baseline, baseline_path, threshold,
+         metrics_path):
+    """
+    Measure per-stage and end-to-end latency and throughput of the prediction pipeline offline.
+    """
+    sizes = [size.strip() for size in sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        raise click.BadParameter(f"Unknown sizes: {', '.join(unknown)}", param_hint="--sizes")
+    counts = [int(count) for count in counts.split(",") if count.strip()]
+    if record and not fixtures:
+        raise click.UsageError("--record needs --fixtures to save the responses into")
+
+    with StubServer(latency_ms / 1000, jitter_ms / 1000, fixtures_dir=fixtures, record=record) as stub:
+        use_stub(stub.url)
+        started = time.perf_counter()
+        results = run_benchmarks(sizes, counts, iterations)
+        elapsed = time.perf_counter() - started
+    click.echo(f"\n{elapsed:.1f} s, stand-in requests: {stub.requests}")
+
+    click.echo(f"\n{'traced stage':<27}{'calls':>10}{'total s':>10}{'mean ms':>10}")
+    for row in metrics.summary():
+        click.echo(f"{row['stage']:<27}{row['count']:>10}{row['total']:>10.2f}{row['mean'] * 1000:>10.1f}")
+    if metrics_path:
+        metrics.dump(metrics_path, spans_path=metrics_path + ".spans.jsonl")
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "latency_ms": latency_ms,
+            "jitter_ms": jitter_ms,
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+    if save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(save_baseline)), exist_ok=True)
+        with open(save_baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        click.echo(f"Baseline saved to {save_baseline}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), threshold)
+        if regressions:
+            click.echo(f"{len(regressions)} regression(s) above {threshold:.0%}", err=True)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
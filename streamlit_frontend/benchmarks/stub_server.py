@@ -0,0 +1,276 @@
+"""
+Local stand-in for the Sentinel Hub and OpenWeather APIs, used by the benchmarks.
+
+Responses are replayed from recorded fixtures when one matches the request, and synthesized otherwise:
+Sentinel Hub process requests get deterministic rasters of the requested size for every output of the
+evalscript, OpenWeather requests a current weather report and a five day forecast. Every response is delayed
+by a configurable latency with jitter, so the pipeline sees realistic round trips without spending API quota.
+
+In record mode unmatched requests are forwarded to the real APIs and their responses saved as fixtures.
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import requests
+import tifffile
+from PIL import Image
+
+SENTINEL_UPSTREAM = "https://services.sentinel-hub.com"
+OPENWEATHER_UPSTREAM = "https://api.openweathermap.org"
+
+TOKEN_PATH = "/oauth/token"
+PROCESS_PATH = "/api/v1/process"
+WEATHER_PREFIX = "/data/2.5/"
+
+# Query parameters that carry credentials and are left out of fixture keys
+SECRET_PARAMS = {"appid"}
+
+# Outputs declared in an evalscript's setup(), e.g. { id: "ndvi_index", bands: 1, sampleType: "FLOAT32" }
+OUTPUT_PATTERN = re.compile(r'id:\s*"(\w+)",\s*bands:\s*(\d+)(?:,\s*sampleType:\s*"(\w+)")?')
+
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/tiff": "tif"}
+CONTENT_TYPES = {extension: content_type for content_type, extension in EXTENSIONS.items()}
+
+
+def fixture_key(method, path, query, body):
+    """
+    Content address of a request, ignoring credentials and the order of query parameters.
+    """
+    params = sorted((name, value) for name, value in parse_qsl(query) if name not in SECRET_PARAMS)
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True)
+        except ValueError:
+            body = body.decode("latin-1")
+    payload = json.dumps([method, path, params, body or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _raster(identifier, width, height, bands, sample_type):
+    # Deterministic per output: a smooth field plus noise, seeded by the identifier and size
+    seed = int(hashlib.sha1(f"{identifier}:{width}x{height}".encode()).hexdigest()[:8], 16)
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    field = np.sin(x / max(width, 1) * 3 + rng.uniform(0, 6)) * np.cos(y / max(height, 1) * 2 + rng.uniform(0, 6))
+
+    if sample_type == "FLOAT32":
+        values = 0.6 * field + rng.normal(0, 0.05, field.shape)
+        return np.repeat(values[..., None], bands, axis=2).squeeze().astype(np.float32)
+    if identifier == "cloud" or bands == 1:
+        # about 5 % cloudy pixels
+        return (rng.random(field.shape) < 0.05).astype(np.uint8)
+    values = ((field + 1) * 127.5).astype(np.uint8)
+    return np.repeat(values[..., None], bands, axis=2)
+
+
+def _encode(array, extension):
+    buffer = io.BytesIO()
+    if extension == "tif":
+        tifffile.imwrite(buffer, array)
+    else:
+        Image.fromarray(array).save(buffer, format="PNG" if extension == "png" else "JPEG")
+    return buffer.getvalue()
+
+
+def synthesize_process(payload):
+    """
+    Response body and content type for a Sentinel Hub process request: a single image, or a tar archive
+    with one file per response when several are requested.
+    """
+    output = payload.get("output", {})
+    width, height = int(output.get("width", 256)), int(output.get("height", 256))
+    declared = {
+        identifier: (int(bands), sample_type or "AUTO")
+        for identifier, bands, sample_type in OUTPUT_PATTERN.findall(payload.get("evalscript", ""))
+    }
+    responses = output.get("responses") or [{"identifier": "default", "format": {"type": "image/png"}}]
+
+    files = []
+    for response in responses:
+        identifier = response["identifier"]
+        extension = EXTENSIONS.get(response["format"]["type"], "tif")
+        bands, sample_type = declared.get(identifier, (1, "FLOAT32" if extension == "tif" else "AUTO"))
+        array = _raster(identifier, width, height, bands, sample_type)
+        files.append((f"{identifier}.{extension}", _encode(array, extension)))
+
+    if len(files) == 1:
+        name, data = files[0]
+        return data, CONTENT_TYPES[name.rsplit(".", 1)[1]]
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue(), "application/x-tar"
+
+
+def synthesize_weather(path, params):
+    lat = float(params.get("lat", 52.65))
+    lon = float(params.get("lon", 16.25))
+    rng = random.Random(f"{lat:.2f}:{lon:.2f}")
+    now = int(time.time())
+    if path.endswith("/forecast"):
+        forecasts = []
+        for i in range(40):
+            forecast = {"dt": now + i * 3 * 3600, "main": {"temp": 12 + rng.uniform(-5, 10), "humidity": rng.randint(40, 95)}}
+            if rng.random() < 0.2:
+                forecast["rain"] = {"3h": round(rng.uniform(0.1, 4), 2)}
+            forecasts.append(forecast)
+        return {"cod": "200", "cnt": len(forecasts), "list": forecasts}
+
+    report = {
+        "coord": {"lat": lat, "lon": lon},
+        "main": {"temp": 12 + rng.uniform(-5, 10), "humidity": rng.randint(40, 95)},
+        "dt": now,
+    }
+    if rng.random() < 0.2:
+        report["rain"] = {"1h": round(rng.uniform(0.1, 6), 2)}
+    return report
+
+
+class StubServer:
+    """
+    Threaded stand-in server. Use as a context manager or call start() and stop().
+    :param latency: Mean added delay per response in seconds
+    :param jitter: Standard deviation of the delay in seconds
+    :param fixtures_dir: Directory with recorded responses, replayed when a request matches
+    :param record: Forward unmatched requests to the real APIs and save their responses into fixtures_dir
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, fixtures_dir=None, record=False, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fixtures_dir = fixtures_dir
+        self.record = record
+        self.requests = {"token": 0, "process": 0, "weather": 0, "replayed": 0, "recorded": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, name):
+        with self._lock:
+            self.requests[name] += 1
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+    def _fixture_path(self, key, extension):
+        return os.path.join(self.fixtures_dir, f"{key}.{extension}")
+
+    def replay(self, key):
+        if not self.fixtures_dir or not os.path.exists(self._fixture_path(key, "json")):
+            return None
+        with open(self._fixture_path(key, "json"), encoding="utf-8") as file:
+            meta = json.load(file)
+        with open(self._fixture_path(key, "bin"), "rb") as file:
+            body = file.read()
+        self.count("replayed")
+        return meta["status"], body, meta["content_type"]
+
+    def forward(self, key, method, path, query, body, headers):
+        upstream = OPENWEATHER_UPSTREAM if path.startswith(WEATHER_PREFIX) else SENTINEL_UPSTREAM
+        # tokens are passed through but never saved
+        token = path == TOKEN_PATH
+        upstream_path = "/auth/realms/main/protocol/openid-connect/token" if token else path
+        url = f"{upstream}{upstream_path}" + (f"?{query}" if query else "")
+        forwarded = {name: value for name, value in headers.items() if name.lower() not in ("host", "content-length")}
+        response = requests.request(method, url, data=body, headers=forwarded, timeout=120)
+        content_type = response.headers.get("Content-Type", "application/octet-stream")
+        if response.ok and not token and self.fixtures_dir:
+            os.makedirs(self.fixtures_dir, exist_ok=True)
+            # body first, a fixture only counts once its metadata exists
+            with open(self._fixture_path(key, "bin"), "wb") as file:
+                file.write(response.content)
+            with open(self._fixture_path(key, "json"), "w", encoding="utf-8") as file:
+                json.dump({"status": response.status_code, "content_type": content_type, "url": url.split("?")[0]}, file)
+            self.count("recorded")
+        return response.status_code, response.content, content_type
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, without this small responses wait for delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                stub.delay()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, method):
+                parts = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                key = fixture_key(method, parts.path, parts.query, body)
+
+                if parts.path == TOKEN_PATH and not stub.record:
+                    stub.count("token")
+                    token = {"access_token": "benchmark", "token_type": "Bearer", "expires_in": 3600,
+                             "expires_at": time.time() + 3600}
+                    return self._send(200, json.dumps(token).encode(), "application/json")
+
+                replayed = stub.replay(key)
+                if replayed is not None:
+                    return self._send(*replayed)
+                if stub.record:
+                    return self._send(*stub.forward(key, method, parts.path, parts.query, body, self.headers))
+
+                if parts.path == PROCESS_PATH:
+                    stub.count("process")
+                    data, content_type = synthesize_process(json.loads(body or b"{}"))
+                    return self._send(200, data, content_type)
+                if parts.path.startswith(WEATHER_PREFIX):
+                    stub.count("weather")
+                    report = synthesize_weather(parts.path, dict(parse_qsl(parts.query)))
+                    return self._send(200, json.dumps(report).encode(), "application/json")
+                return self._send(404, b'{"error": "not found"}', "application/json")
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
@@ -0,0 +1,30 @@
+import pytest
+
+from backend.model.geometry import validate_polygon
+from backend.model.zonal import polygon_rings
+
+RING = [[16.24, 52.65], [16.25, 52.65], [16.25, 52.66], [16.24, 52.65]]
+
+
+@pytest.mark.parametrize("coordinates", [
+    [[["a", "b"]]],
+    [[[0, 0], [0, 0]]],
+    [[[0, 0], [1, 1], [2, 2], [0, 0]]],
+    [[[0, 0], [1, 0], [0, "q"]]],
+    [],
+    "x",
+])
+def test_validate_polygon_rejects_bad_geometry(coordinates):
+    with pytest.raises(ValueError):
+        validate_polygon(coordinates)
+
+
+def test_validate_polygon_accepts_rings_polygons_and_multipolygons():
+    validate_polygon(RING)
+    validate_polygon([RING])
+    validate_polygon([[RING], [[point + [120.0] for point in RING]]])
+
+
+def test_polygon_rings_rejects_non_numeric_leaves():
+    with pytest.raises(ValueError):
+        polygon_rings([[["a", "b"]]])
@@ -0,0 +1,19 @@
+from backend.model import predict
+
+RING = [[16.24, 52.65], [16.25, 52.65], [16.25, 52.66], [16.24, 52.65]]
+
+
+def test_predict_on_polygons_yields_errors_for_bad_polygons(monkeypatch):
+    def fetch_tile_stats(bbox, polygons, interval=None):
+        return [({"NDVI Index": {"mean": 0.5}, "EVI Index": {"mean": 0.3}, "Moisture Stress": {"mean": 0.1}}, {})
+                for _ in polygons]
+
+    monkeypatch.setattr(predict, "fetch_tile_stats", fetch_tile_stats)
+    monkeypatch.setattr(predict, "_predict_from_results", lambda coords, results, centroid=None: (True,) + (0.0,) * 4)
+
+    results = {key: (result, error) for key, result, error in
+               predict.predict_on_polygons({"empty": [[]], "flat": [[[0, 0], [0, 0]]], "good": [RING]})}
+
+    assert isinstance(results["empty"][1], ValueError)
+    assert isinstance(results["flat"][1], ValueError)
+    assert results["good"] == ((True, 0.0, 0.0, 0.0, 0.0), None)
@@ -0,0 +1,15 @@
+from shapely.geometry import box
+
+from backend.model.spatial_index import PolygonIndex
+
+
+def test_query_point_searches_tree_and_buffer_in_insertion_order():
+    index = PolygonIndex(rebuild_threshold=2)
+    index.add("outer", box(0, 0, 10, 10))
+    index.add("left", box(0, 0, 5, 10))
+    # built into the tree, the last one stays in the buffer
+    index.add("inner", {"type": "Polygon", "coordinates": [[[1, 1], [4, 1], [4, 4], [1, 4], [1, 1]]]})
+
+    assert index.query_point(2, 2) == ["outer", "left", "inner"]
+    assert index.query_point(7, 7) == ["outer"]
+    assert index.query_point(20, 20) == []
@@ -0,0 +1,56 @@
+import numpy as np
+
+from backend.model import irrigation
+from backend.model.zonal import label_image, masked_stats, overlapped_zones, polygon_mask
+
+BBOX = [16.0, 52.0, 16.01, 52.01]
+SHAPE = (100, 100)
+
+
+def square(min_lon, min_lat, size):
+    return [
+        [min_lon, min_lat],
+        [min_lon + size, min_lat],
+        [min_lon + size, min_lat + size],
+        [min_lon, min_lat + size],
+        [min_lon, min_lat],
+    ]
+
+
+INNER = square(16.003, 52.003, 0.004)
+OUTER = square(16.001, 52.001, 0.008)
+SEPARATE = square(16.0, 52.0, 0.0009)
+
+
+def fake_tile(shape):
+    rng = np.random.default_rng(0)
+    data = {"cloud.tif": (rng.random(shape) < 0.1).astype(np.uint8)}
+    for indicator in irrigation.indicators:
+        data[f"{indicator['id']}_index.tif"] = rng.uniform(-1, 1, shape).astype(np.float32)
+        data[f"{indicator['id']}_default.png"] = np.zeros(shape + (4,), dtype=np.uint8)
+    return data
+
+
+def test_overlapped_zones_finds_nested_and_duplicate_polygons():
+    polygons = [INNER, SEPARATE, OUTER, SEPARATE]
+    labels = label_image(polygons, BBOX, SHAPE)
+
+    # the inner square lies under the outer one, the first copy of the duplicate under the second
+    assert overlapped_zones(polygons, BBOX, SHAPE, labels) == [0, 1]
+    assert overlapped_zones([OUTER, INNER], BBOX, SHAPE, label_image([OUTER, INNER], BBOX, SHAPE)) == [0]
+    assert overlapped_zones([INNER, SEPARATE], BBOX, SHAPE, label_image([INNER, SEPARATE], BBOX, SHAPE)) == []
+
+
+def test_fetch_tile_stats_matches_single_polygon_stats_for_overlaps(monkeypatch):
+    data = fake_tile(SHAPE)
+    monkeypatch.setattr(irrigation, "get_data_for_bbox", lambda *args, **kwargs: data)
+    polygons = [INNER, SEPARATE, OUTER, SEPARATE]
+
+    results = irrigation.fetch_tile_stats(BBOX, polygons, ("2024-06-01", "2024-06-10"))
+
+    for polygon_coords, (stats, _) in zip(polygons, results):
+        mask = polygon_mask(polygon_coords, BBOX, SHAPE)
+        for indicator in irrigation.indicators:
+            expected = masked_stats(data[f"{indicator['id']}_index.tif"], mask, data["cloud.tif"])
+            assert stats[indicator["name"]]["pixels"] == np.count_nonzero(mask) > 0
+            assert np.isclose(stats[indicator["name"]]["mean"], expected["mean"])